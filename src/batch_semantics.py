@@ -0,0 +1,324 @@
+import itertools
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from node_state import NodeState
+from process_tree import ProcessTree
+from semantics import Transition
+from tree_state import TupleTreeState
+from tree_utils import (
+    is_do_child,
+    is_parallel,
+    is_redo_child,
+    is_reverse_sequence,
+    is_root,
+    is_sequence,
+    is_xor,
+)
+
+# inverting a state maps code c to CLOSED_CODE - c
+FUTURE_CODE = 0
+OPEN_CODE = 1
+CLOSED_CODE = 2
+
+_ENCODE = {NodeState.FUTURE: FUTURE_CODE, NodeState.OPEN: OPEN_CODE, NodeState.CLOSED: CLOSED_CODE}
+DECODE = (NodeState.FUTURE, NodeState.OPEN, NodeState.CLOSED)
+
+# (from, to) codes of the four transition kinds, in the order returned by get_valid_transitions
+TRANSITION_KINDS = (
+    (FUTURE_CODE, OPEN_CODE),
+    (FUTURE_CODE, CLOSED_CODE),
+    (CLOSED_CODE, FUTURE_CODE),
+    (OPEN_CODE, CLOSED_CODE),
+)
+
+# kinds of sibling conditions that only depend on the siblings being open
+_NEVER = 0
+_ANY_OPEN = 1
+_ALL_OPEN = 2
+_NONE_OPEN = 3
+
+
+def encode_states(states: Sequence[TupleTreeState]) -> np.ndarray:
+    if not states:
+        return np.zeros((0, 0), dtype=np.int8)
+    encode = _ENCODE.__getitem__
+    num_nodes = len(states[0].state_list)
+    codes = itertools.chain.from_iterable(map(encode, state.state_list) for state in states)
+    return np.fromiter(codes, dtype=np.int8, count=len(states) * num_nodes).reshape(len(states), num_nodes)
+
+
+def decode_states(states: np.ndarray) -> List[TupleTreeState]:
+    decode = DECODE.__getitem__
+    return [TupleTreeState(state_list=tuple(map(decode, row))) for row in states.tolist()]
+
+
+def pack_states(states: np.ndarray) -> np.ndarray:
+    """Packs each row of encoded states into bytes holding four 2-bit node states each."""
+    padded = np.zeros((len(states), -(-states.shape[1] // 4) * 4), dtype=np.uint8)
+    padded[:, : states.shape[1]] = states
+    quads = padded.reshape(len(states), padded.shape[1] // 4, 4)
+    return quads[:, :, 0] | quads[:, :, 1] << 2 | quads[:, :, 2] << 4 | quads[:, :, 3] << 6
+
+
+def unpack_states(packed: np.ndarray, num_nodes: int) -> np.ndarray:
+    states = np.stack([(packed >> shift) & 3 for shift in (0, 2, 4, 6)], axis=-1)
+    return states.reshape(len(packed), packed.shape[1] * 4)[:, :num_nodes].astype(np.int8)
+
+
+def state_keys(states: np.ndarray) -> np.ndarray:
+    """One sortable scalar per row of encoded states, a uint64 for up to 32 nodes and raw bytes otherwise."""
+    packed = pack_states(states)
+    width = -(-packed.shape[1] // 8) * 8
+    padded = np.zeros((len(packed), width), dtype=np.uint8)
+    padded[:, : packed.shape[1]] = packed
+    return padded.view("<u8" if width == 8 else f"V{width}").ravel()
+
+
+class StateKeySet:
+    """Set of state keys that answers membership for a whole array of keys at once.
+
+    Keys are kept in sorted runs, each at least twice as long as the next newer one, so
+    adding merges O(log n) runs amortised and a lookup binary searches each run.
+    """
+
+    def __init__(self):
+        self._runs: List[np.ndarray] = []
+
+    def add(self, keys: np.ndarray):
+        if len(keys) == 0:
+            return
+        run = np.unique(keys)
+        while self._runs and len(self._runs[-1]) <= 2 * len(run):
+            run = np.union1d(self._runs.pop(), run)
+        self._runs.append(run)
+
+    def contains(self, keys: np.ndarray) -> np.ndarray:
+        found = np.zeros(len(keys), dtype=bool)
+        for run in self._runs:
+            positions = np.minimum(np.searchsorted(run, keys), len(run) - 1)
+            found |= run[positions] == keys
+        return found
+
+    def __len__(self) -> int:
+        return sum(len(run) for run in self._runs)
+
+
+def _preorder(tree: ProcessTree) -> List[ProcessTree]:
+    nodes = [tree]
+    for child in tree.children:
+        nodes.extend(_preorder(child))
+    return nodes
+
+
+class BatchProcessTreeSemantics:
+    """Evaluates ProcessTreeSemanticsInvertible for a whole matrix of encoded states at once.
+
+    Every guard is a conjunction of "all descendants future/closed" and "is open" conditions
+    over fixed node sets, which are precomputed as masks so that a batch of states is checked
+    with a few matrix products instead of per-state recursion.
+    """
+
+    def __init__(self, tree: ProcessTree):
+        self.nodes = _preorder(tree)
+        size = len(self.nodes)
+        self.nodes_by_position = [None] * size
+        for node in self.nodes:
+            self.nodes_by_position[node.position] = node
+
+        # transitions[kind][position], shared by all successors
+        self.transitions = tuple(
+            tuple(
+                Transition(node, DECODE[from_code], DECODE[to_code]) for node in self.nodes_by_position
+            )
+            for from_code, to_code in TRANSITION_KINDS
+        )
+
+        self._order = np.array([node.position for node in self.nodes])
+        self._is_root = np.zeros(size, dtype=bool)
+        self._parent = np.zeros(size, dtype=np.intp)
+
+        descendants = np.zeros((size, size), dtype=np.int32)
+        f2o_future = np.zeros((size, size), dtype=np.int32)
+        f2o_closed = np.zeros((size, size), dtype=np.int32)
+        o2c_future = np.zeros((size, size), dtype=np.int32)
+        o2c_closed = np.zeros((size, size), dtype=np.int32)
+        self._f2o_possible = np.ones(size, dtype=bool)
+        self._o2c_possible = np.ones(size, dtype=bool)
+
+        self._f2c_kind = np.full(size, _NEVER)
+        self._c2f_kind = np.full(size, _NEVER)
+        f2c_siblings = np.zeros((size, size), dtype=np.int32)
+        c2f_siblings = np.zeros((size, size), dtype=np.int32)
+
+        for node in self.nodes:
+            n = node.position
+            for descendant in _preorder(node):
+                descendants[n, descendant.position] = 1
+            for child in node.children:
+                f2o_future[n, child.position] = 1
+                o2c_closed[n, child.position] = 1
+
+            if is_root(node):
+                self._is_root[n] = True
+                continue
+
+            parent = node.parent
+            self._parent[n] = parent.position
+            idx = parent.children.index(node)
+            lsibs = [sib.position for sib in parent.children[:idx]]
+            rsibs = [sib.position for sib in parent.children[idx + 1 :]]
+
+            if is_parallel(parent):
+                pass
+            elif is_sequence(parent):
+                f2o_closed[n, lsibs] = 1
+                f2o_future[n, rsibs] = 1
+                o2c_closed[n, lsibs] = 1
+                o2c_future[n, rsibs] = 1
+            elif is_reverse_sequence(parent):
+                f2o_future[n, lsibs] = 1
+                f2o_closed[n, rsibs] = 1
+                o2c_future[n, lsibs] = 1
+                o2c_closed[n, rsibs] = 1
+            elif is_xor(parent):
+                f2o_future[n, lsibs + rsibs] = 1
+                o2c_closed[n, lsibs + rsibs] = 1
+            elif is_do_child(node):
+                f2o_future[n, parent.children[1].position] = 1
+                o2c_closed[n, parent.children[1].position] = 1
+            elif is_redo_child(node):
+                f2o_closed[n, parent.children[0].position] = 1
+                o2c_future[n, parent.children[0].position] = 1
+            else:
+                self._f2o_possible[n] = False
+                self._o2c_possible[n] = False
+
+            if is_xor(parent):
+                self._f2c_kind[n] = _ANY_OPEN
+                f2c_siblings[n, lsibs + rsibs] = 1
+            elif is_redo_child(node):
+                self._f2c_kind[n] = _ALL_OPEN
+                f2c_siblings[n, lsibs] = 1
+
+            if is_do_child(node):
+                self._c2f_kind[n] = _ALL_OPEN
+                c2f_siblings[n, parent.children[1].position] = 1
+            elif is_redo_child(node):
+                self._c2f_kind[n] = _NONE_OPEN
+                c2f_siblings[n, parent.children[0].position] = 1
+
+        self._descendants = descendants.T
+        self._f2o_future = f2o_future.T
+        self._f2o_closed = f2o_closed.T
+        self._o2c_future = o2c_future.T
+        self._o2c_closed = o2c_closed.T
+        self._f2c_siblings = f2c_siblings.T
+        self._c2f_siblings = c2f_siblings.T
+
+    @staticmethod
+    def _none(condition: np.ndarray, masks: np.ndarray) -> np.ndarray:
+        return condition.astype(np.int32) @ masks == 0
+
+    def _sibling_conditions(self, kind: np.ndarray, is_open: np.ndarray, masks: np.ndarray) -> np.ndarray:
+        open_count = is_open.astype(np.int32) @ masks
+        all_open = (~is_open).astype(np.int32) @ masks == 0
+        return (
+            ((kind == _ANY_OPEN) & (open_count > 0))
+            | ((kind == _ALL_OPEN) & all_open)
+            | ((kind == _NONE_OPEN) & (open_count == 0))
+        )
+
+    def _propagate_to_ancestors(
+        self, state_condition: np.ndarray, sibling_condition: np.ndarray, is_open: np.ndarray
+    ) -> np.ndarray:
+        # can_future_to_closed / can_closed_to_future defer to the parent unless it is open
+        result = np.zeros_like(state_condition)
+        for n in self._order:
+            if self._is_root[n]:
+                continue
+            p = self._parent[n]
+            result[:, n] = state_condition[:, n] & np.where(
+                is_open[:, p], sibling_condition[:, n], result[:, p]
+            )
+        return result
+
+    def get_valid_transitions(self, states: np.ndarray) -> Tuple[np.ndarray, ...]:
+        """Boolean (states x nodes) matrices of the enabled transitions, one per TRANSITION_KINDS entry."""
+        is_future = states == FUTURE_CODE
+        is_open = states == OPEN_CODE
+        is_closed = states == CLOSED_CODE
+
+        all_future = self._none(~is_future, self._descendants)
+        all_closed = self._none(~is_closed, self._descendants)
+        parent_open = self._is_root | is_open[:, self._parent]
+
+        can_f2o = (
+            self._f2o_possible
+            & parent_open
+            & self._none(~all_future, self._f2o_future)
+            & self._none(~all_closed, self._f2o_closed)
+        )
+        can_o2c = (
+            self._o2c_possible
+            & parent_open
+            & self._none(~all_future, self._o2c_future)
+            & self._none(~all_closed, self._o2c_closed)
+        )
+        can_f2c = self._propagate_to_ancestors(
+            is_future, self._sibling_conditions(self._f2c_kind, is_open, self._f2c_siblings), is_open
+        )
+        can_c2f = self._propagate_to_ancestors(
+            is_closed, self._sibling_conditions(self._c2f_kind, is_open, self._c2f_siblings), is_open
+        )
+
+        future_to_open = is_future & can_f2o
+        open_to_closed = is_open & can_o2c
+
+        # get_valid_transitions does not descend below a node that opens or closes
+        blocks = future_to_open | open_to_closed
+        reached = np.ones_like(is_future)
+        for n in self._order:
+            if not self._is_root[n]:
+                p = self._parent[n]
+                reached[:, n] = reached[:, p] & ~blocks[:, p]
+
+        return (
+            reached & future_to_open,
+            reached & is_future & ~can_f2o & can_f2c,
+            reached & can_c2f,
+            reached & open_to_closed,
+        )
+
+    def get_successors(
+        self, states: np.ndarray, unique: bool = True
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Returns the successors with, per row, the parent row, the node position and the transition kind.
+
+        If ``unique``, a successor reached from several states of the batch is only returned for the
+        first of them, which is only correct if all transitions cost the same.
+        """
+        successors, parents, positions, kinds = [], [], [], []
+        for kind, enabled in enumerate(self.get_valid_transitions(states)):
+            rows, cols = np.nonzero(enabled)
+            new_states = states[rows]
+            new_states[np.arange(len(rows)), cols] = TRANSITION_KINDS[kind][1]
+            successors.append(new_states)
+            parents.append(rows)
+            positions.append(cols)
+            kinds.append(np.full(len(rows), kind))
+
+        successors = np.concatenate(successors)
+        if not unique:
+            return successors, np.concatenate(parents), np.concatenate(positions), np.concatenate(kinds)
+
+        _, first_occurrences = np.unique(state_keys(successors), return_index=True)
+        keep = np.sort(first_occurrences)
+
+        return (
+            successors[keep],
+            np.concatenate(parents)[keep],
+            np.concatenate(positions)[keep],
+            np.concatenate(kinds)[keep],
+        )
@@ -0,0 +1,224 @@
+import hashlib
+import itertools
+import json
+import os
+import struct
+import sys
+from typing import BinaryIO, Dict, Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+
+from batch_semantics import DECODE, decode_states, encode_states, pack_states, state_keys, unpack_states
+from search import PtStateSpaceSearch, SearchState
+from semantics import Transition
+from tree_utils import get_nodes_as_set
+
+_MAGIC = b"PTSSCKPT"
+_VERSION = 2
+# magic, version, number of nodes, digest of the tree and search options
+_HEADER = struct.Struct("<8sHI32s")
+_CHUNK = struct.Struct("<I")
+_TRAILER = struct.Struct("<Qd")
+
+_RECORD = np.dtype(
+    [
+        ("dist", "<f8"),
+        ("depth", "<i4"),
+        ("position", "<i4"),
+        ("from_state", "u1"),
+        ("to_state", "u1"),
+        ("flags", "u1"),
+    ]
+)
+_LEAF_EXECUTION = 1
+# the distance map marks the state as expanded
+_VISITED = 2
+
+# small chunks keep the memory needed for writing independent of the search size
+_CHUNK_SIZE = 1 << 12
+
+_ENCODE_NODE_STATE = {node_state: code for code, node_state in enumerate(DECODE)}
+
+
+def search_fingerprint(search: PtStateSpaceSearch, unidirectional: bool) -> bytes:
+    """Digest of the tree and of the options that determine the search, which a checkpoint is only valid for."""
+    cost_model = search.cost_model
+    options = [
+        repr(search.tree),
+        search.backward_in_forward_coordinates,
+        search.batch_expansion,
+        unidirectional,
+        f"{type(cost_model).__module__}.{type(cost_model).__qualname__}",
+        vars(cost_model),
+    ]
+    return hashlib.sha256(json.dumps(options, sort_keys=True, default=repr).encode()).digest()
+
+
+def _write_records(file: BinaryIO, entries: Iterable[Tuple[int, SearchState]]):
+    """Writes (flags, search state) pairs in chunks, each preceded by its length, and an empty chunk last.
+
+    Parents are not written: the parent of a state is the expanded state before its transition,
+    which is in the distance map.
+    """
+    entries = iter(entries)
+    while chunk := list(itertools.islice(entries, _CHUNK_SIZE)):
+        transitions = [search_state.transition for _, search_state in chunk]
+        records = np.zeros(len(chunk), dtype=_RECORD)
+        records["dist"] = [search_state.dist for _, search_state in chunk]
+        records["depth"] = [search_state.depth for _, search_state in chunk]
+        records["position"] = [-1 if t is None else t.node.position for t in transitions]
+        records["from_state"] = [0 if t is None else _ENCODE_NODE_STATE[t.from_state] for t in transitions]
+        records["to_state"] = [0 if t is None else _ENCODE_NODE_STATE[t.to_state] for t in transitions]
+        records["flags"] = [
+            flags | (_LEAF_EXECUTION if search_state.leaf_execution is not None else 0)
+            for flags, search_state in chunk
+        ]
+
+        file.write(_CHUNK.pack(len(chunk)))
+        file.write(records.tobytes())
+        file.write(pack_states(encode_states([search_state.tree_state for _, search_state in chunk])).tobytes())
+    file.write(_CHUNK.pack(0))
+
+
+def _write_direction(file: BinaryIO, distance_map, open_set, meeting_node: Optional[SearchState]):
+    _write_records(
+        file,
+        ((_VISITED if dist == -sys.maxsize else 0, search_state) for dist, search_state in distance_map.values()),
+    )
+    _write_records(file, ((0, search_state) for search_state in open_set))
+    _write_records(file, [(0, meeting_node)] if meeting_node is not None else [])
+
+
+def save_checkpoint(search: PtStateSpaceSearch, path: str, unidirectional: bool = False):
+    """Writes the search data structures to ``path``, replacing it atomically.
+
+    States are streamed in small chunks as packed 2-bit node states, so writing needs
+    little memory besides the search itself.
+    """
+    sds = search._search_data_structures
+    if not getattr(sds.distances_forward, "stores_search_states", True):
+        raise ValueError("checkpoints require a distance map that stores search states")
+    meeting_info = sds.meeting_info
+    num_nodes = len(get_nodes_as_set(search.tree))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(_HEADER.pack(_MAGIC, _VERSION, num_nodes, search_fingerprint(search, unidirectional)))
+        _write_direction(file, sds.distances_forward, sds.open_set_forward, meeting_info.start_node)
+        _write_direction(file, sds.distances_backward, sds.open_set_backward, meeting_info.end_node)
+        file.write(_TRAILER.pack(search._search_statistics.visited_state, meeting_info.best_path_cost))
+    os.replace(tmp_path, path)
+
+
+def _read_exactly(file: BinaryIO, size: int) -> bytes:
+    data = file.read(size)
+    if len(data) != size:
+        raise ValueError("truncated checkpoint")
+    return data
+
+
+def _read_array(file: BinaryIO, dtype, count: int) -> np.ndarray:
+    dtype = np.dtype(dtype)
+    return np.frombuffer(_read_exactly(file, dtype.itemsize * count), dtype=dtype)
+
+
+def _read_records(
+    file: BinaryIO, search: PtStateSpaceSearch, num_nodes: int, from_start: bool
+) -> Iterator[Tuple[int, SearchState]]:
+    tree = search.tree if from_start else search._reverse_tree
+    nodes_by_position = {node.position: node for node in get_nodes_as_set(tree)}
+    transitions: Dict[Tuple[int, int, int], Transition] = {}
+    expanded_keys = None
+    if search.batch_expansion:
+        expanded_keys = search._expanded_keys_forward if from_start else search._expanded_keys_backward
+    packed_width = -(-num_nodes // 4)
+
+    while True:
+        (count,) = _CHUNK.unpack(_read_exactly(file, _CHUNK.size))
+        if count == 0:
+            return
+        records = _read_array(file, _RECORD, count)
+        packed = _read_array(file, np.uint8, count * packed_width).reshape(count, packed_width)
+        states = unpack_states(packed, num_nodes)
+        if expanded_keys is not None:
+            expanded_keys.add(state_keys(states[(records["flags"] & _VISITED) != 0]))
+
+        for (dist, depth, position, from_code, to_code, flags), tree_state in zip(
+            records.tolist(), decode_states(states)
+        ):
+            transition = None
+            if position >= 0:
+                key = (position, from_code, to_code)
+                if key not in transitions:
+                    transitions[key] = Transition(nodes_by_position[position], DECODE[from_code], DECODE[to_code])
+                transition = transitions[key]
+
+            yield flags, SearchState(
+                dist=dist,
+                depth=depth,
+                tree_state=tree_state,
+                from_start=from_start,
+                transition=transition,
+                leaf_execution=transition.node if flags & _LEAF_EXECUTION else None,
+            )
+
+
+def _shared(distance_map, search_state: SearchState) -> SearchState:
+    # open set entries are mostly the values of the distance map, so they are not kept twice
+    if search_state.tree_state in distance_map:
+        stored = distance_map[search_state.tree_state][1]
+        if stored.dist == search_state.dist and stored.transition == search_state.transition:
+            return stored
+    return search_state
+
+
+def _read_direction(
+    file: BinaryIO, search: PtStateSpaceSearch, num_nodes: int, from_start: bool
+) -> Optional[SearchState]:
+    sds = search._search_data_structures
+    distance_map = sds.distances_forward if from_start else sds.distances_backward
+    open_set = sds.open_set_forward if from_start else sds.open_set_backward
+
+    for flags, search_state in _read_records(file, search, num_nodes, from_start):
+        dist = -sys.maxsize if flags & _VISITED else search_state.dist
+        distance_map[search_state.tree_state] = (dist, search_state)
+
+    # the stored order is a valid heap or deque order already
+    for _, search_state in _read_records(file, search, num_nodes, from_start):
+        open_set.append(_shared(distance_map, search_state))
+
+    meeting_node = None
+    for _, search_state in _read_records(file, search, num_nodes, from_start):
+        meeting_node = _shared(distance_map, search_state)
+    return meeting_node
+
+
+def load_checkpoint(search: PtStateSpaceSearch, path: str, unidirectional: bool = False):
+    """Replaces the search data structures of ``search`` with the ones stored at ``path``.
+
+    Raises ValueError if the checkpoint was written for another tree or other search options.
+    Loaded states have no parent reference, the search rebuilds paths from the distance maps.
+    """
+    search.init_data_structures()
+    sds = search._search_data_structures
+    sds.open_set_forward.clear()
+    sds.open_set_backward.clear()
+    sds.distances_forward = search.distance_map_factory()
+    sds.distances_backward = search.distance_map_factory()
+
+    with open(path, "rb") as file:
+        magic, version, num_nodes, fingerprint = _HEADER.unpack(_read_exactly(file, _HEADER.size))
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{path} is not a search checkpoint")
+        if fingerprint != search_fingerprint(search, unidirectional):
+            raise ValueError(f"{path} was written for a different tree or different search options")
+
+        start_node = _read_direction(file, search, num_nodes, from_start=True)
+        end_node = _read_direction(file, search, num_nodes, from_start=False)
+        visited_state, best_path_cost = _TRAILER.unpack(_read_exactly(file, _TRAILER.size))
+
+    search._search_statistics.visited_state = visited_state
+    meeting_info = sds.meeting_info
+    meeting_info.best_path_cost = sys.maxsize if best_path_cost >= sys.maxsize else best_path_cost
+    meeting_info.start_node = start_node
+    meeting_info.end_node = end_node
@@ -0,0 +1,165 @@
+import argparse
+import functools
+import json
+import sys
+from typing import Any, Dict, Iterator, Optional, TextIO, Tuple
+
+from cost_model import COST_MODELS, TransitionCostModel, cost_model_from_spec
+from search import PtStateSpaceSearch, SearchResult
+from tree_state import TupleTreeState
+from tree_utils import parse_tree_string
+
+STRATEGIES = ("bidirectional", "unidirectional", "hash-distributed")
+
+
+def parse_request(line: str) -> Tuple[Optional[Any], str]:
+    """Returns the id and tree string of a JSON object with "tree" and optional "id", a JSON string or a plain tree string."""
+    if line.startswith("{"):
+        request = json.loads(line)
+        if "tree" not in request:
+            raise ValueError('request has no "tree"')
+        if not isinstance(request["tree"], str):
+            raise ValueError('request "tree" must be a string')
+        return request.get("id"), request["tree"]
+    if line.startswith('"'):
+        return None, json.loads(line)
+    return None, line
+
+
+def read_lines(lines: TextIO) -> Iterator[Tuple[int, str]]:
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if line:
+            yield line_number, line
+
+
+def _distance_map_factory(args: argparse.Namespace):
+    if not args.compact_visited:
+        return dict
+
+    from compact_distance_map import CompactDistanceMap
+
+    return functools.partial(
+        CompactDistanceMap,
+        fingerprint_bits=args.fingerprint_bits,
+        bloom_filter_capacity=args.bloom_filter_capacity,
+    )
+
+
+def _cost_model(args: argparse.Namespace) -> TransitionCostModel:
+    if args.cost_model != "label":
+        return cost_model_from_spec(args.cost_model)
+    return cost_model_from_spec(
+        {
+            "name": "label",
+            "weights": args.label_weights,
+            "default_weight": args.default_weight,
+            "silent_cost": args.silent_cost,
+        }
+    )
+
+
+def _label_weights(value: str) -> Dict[str, float]:
+    try:
+        weights = json.loads(value)
+    except json.JSONDecodeError as exc:
+        raise argparse.ArgumentTypeError(f"invalid JSON: {exc}") from None
+    if not isinstance(weights, dict):
+        raise argparse.ArgumentTypeError('expected a JSON object such as {"a": 2}')
+    return weights
+
+
+def run_search(tree_string: str, args: argparse.Namespace) -> SearchResult:
+    tree = parse_tree_string(tree_string)
+
+    if args.strategy == "hash-distributed":
+        from parallel_search import HashDistributedSearch
+
+        workers = {"num_workers": args.workers} if args.workers is not None else {}
+        return HashDistributedSearch(
+            tree, TupleTreeState, cost_model=_cost_model(args), **workers
+        ).search()
+
+    search = PtStateSpaceSearch(
+        tree,
+        TupleTreeState,
+        backward_in_forward_coordinates=args.forward_coordinates,
+        distance_map_factory=_distance_map_factory(args),
+        batch_expansion=args.batch,
+        cost_model=_cost_model(args),
+    )
+    return search.search(unidirectional=args.strategy == "unidirectional")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Search the state space of process trees given one per line, writing one JSON result per line."
+    )
+    parser.add_argument("input", nargs="?", default="-", help="input file, - for stdin (default)")
+    parser.add_argument("-o", "--output", default="-", help="output file, - for stdout (default)")
+    parser.add_argument("--strategy", choices=STRATEGIES, default="bidirectional")
+    parser.add_argument(
+        "--cost-model",
+        choices=sorted(COST_MODELS),
+        default="unit",
+        help="unit: every transition costs 1, leaf: only leaf executions cost 1, "
+        "label: leaf executions cost their label's weight and other transitions the silent cost",
+    )
+    parser.add_argument(
+        "--label-weights",
+        type=_label_weights,
+        default={},
+        help='weights by leaf label for --cost-model label, as a JSON object such as {"a": 2}',
+    )
+    parser.add_argument("--default-weight", type=float, default=1, help="weight of labels without one")
+    parser.add_argument("--silent-cost", type=float, default=0, help="cost of transitions that execute no leaf")
+    parser.add_argument("--batch", action="store_true", help="expand equal-cost layers vectorised")
+    parser.add_argument(
+        "--forward-coordinates",
+        action="store_true",
+        help="store backward states in forward coordinates",
+    )
+    parser.add_argument("--compact-visited", action="store_true", help="use fingerprint distance maps")
+    parser.add_argument("--fingerprint-bits", type=int, choices=(64, 128), default=64)
+    parser.add_argument("--bloom-filter-capacity", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes for hash-distributed")
+    args = parser.parse_args(argv)
+    try:
+        _cost_model(args)
+    except ValueError as exc:
+        parser.error(str(exc))
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    source = sys.stdin if args.input == "-" else open(args.input)
+    sink = sys.stdout if args.output == "-" else open(args.output, "w")
+    failed = False
+
+    try:
+        for line_number, line in read_lines(source):
+            response: Dict[str, Any] = {"line": line_number}
+            try:
+                request_id, tree_string = parse_request(line)
+                if request_id is not None:
+                    response["id"] = request_id
+                response.update(run_search(tree_string, args).to_dict())
+            # one bad record must not end the stream, whatever the search raises
+            except Exception as exc:
+                response["error"] = str(exc) or type(exc).__name__
+                failed = True
+
+            sink.write(json.dumps(response) + "\n")
+            sink.flush()
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+import math
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from search import SearchState
+from semantics import Transition
+from tree_state import ProcessTreeState
+
+_MASK_64 = (1 << 64) - 1
+_EMPTY = 0
+# the search marks expanded states with -sys.maxsize, which float64 cannot hold exactly
+_VISITED = -sys.maxsize
+
+# record flags
+_VISITED_FLAG = 1
+_FROM_START = 2
+_LEAF_EXECUTION = 4
+_NO_TRANSITION = -1
+
+
+def fingerprint_64(state: ProcessTreeState) -> int:
+    return (hash(state) & _MASK_64) or 1
+
+
+def fingerprint_128(state: ProcessTreeState) -> Tuple[int, int]:
+    # the second word relies on the state's repr identifying it, as TupleTreeState's does
+    return fingerprint_64(state), hash(repr(state)) & _MASK_64
+
+
+class BloomFilter:
+    def __init__(self, expected_items: int, false_positive_rate: float = 0.01):
+        expected_items = max(expected_items, 1)
+        self._bits = max(
+            8, math.ceil(-expected_items * math.log(false_positive_rate) / math.log(2) ** 2)
+        )
+        self._hashes = max(1, round(self._bits / expected_items * math.log(2)))
+        # a bytearray, because indexing it is several times faster than indexing a NumPy array
+        self._array = bytearray((self._bits + 7) // 8)
+
+    def _positions(self, fingerprint: int) -> List[int]:
+        h1 = fingerprint & 0xFFFFFFFF
+        h2 = (fingerprint >> 32) | 1
+        return [(h1 + i * h2) % self._bits for i in range(self._hashes)]
+
+    def add(self, fingerprint: int):
+        for position in self._positions(fingerprint):
+            self._array[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, fingerprint: int) -> bool:
+        array = self._array
+        for position in self._positions(fingerprint):
+            if not array[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._array)
+
+
+class CompactDistanceMap:
+    """Distance map keyed by fixed-width state fingerprints instead of state objects.
+
+    Each slot holds a fingerprint, the distance, the depth, an index into the distinct
+    transitions seen so far and a few flags, in NumPy arrays with open addressing and
+    linear probing. No state objects are kept: ``map[state]`` rebuilds a SearchState
+    without parent from the key and the slot, and the search finds the parent by undoing
+    the transition. Two distinct states with the same fingerprint are treated as one, so
+    a state may be missed with a probability that shrinks with ``fingerprint_bits``.
+    """
+
+    # values are rebuilt on lookup, so the search must not rely on parent references
+    stores_search_states = False
+
+    def __init__(
+        self,
+        fingerprint_bits: int = 64,
+        initial_capacity: int = 1 << 12,
+        max_load_factor: float = 0.5,
+        bloom_filter_capacity: Optional[int] = None,
+        bloom_filter_false_positive_rate: float = 0.01,
+    ):
+        if fingerprint_bits not in (64, 128):
+            raise ValueError("fingerprint_bits must be 64 or 128")
+        if not 0 < max_load_factor < 1:
+            raise ValueError("max_load_factor must be between 0 and 1")
+
+        self._wide = fingerprint_bits == 128
+        self._max_load_factor = max_load_factor
+        self._size = 0
+        self._allocate(1 << max(3, (initial_capacity - 1).bit_length()))
+
+        self._transitions: List[Transition] = []
+        self._transition_ids: Dict[Transition, int] = {}
+
+        # the search looks up the same state several times in a row
+        self._last_state: Optional[ProcessTreeState] = None
+        self._last_location: Tuple[int, int, int, bool] = (0, 0, -1, False)
+
+        self._bloom_filter = (
+            BloomFilter(bloom_filter_capacity, bloom_filter_false_positive_rate)
+            if bloom_filter_capacity is not None
+            else None
+        )
+
+    def _allocate(self, capacity: int):
+        self._mask = capacity - 1
+        self._fingerprints_low = np.zeros(capacity, dtype=np.uint64)
+        self._fingerprints_high = np.zeros(capacity, dtype=np.uint64) if self._wide else None
+        self._distances = np.zeros(capacity, dtype=np.float64)
+        self._depths = np.zeros(capacity, dtype=np.int32)
+        self._transition_indices = np.zeros(capacity, dtype=np.int32)
+        self._flags = np.zeros(capacity, dtype=np.uint8)
+
+    def _fingerprint(self, state: ProcessTreeState) -> Tuple[int, int]:
+        return fingerprint_128(state) if self._wide else (fingerprint_64(state), 0)
+
+    def _find_slot(self, low: int, high: int) -> Tuple[int, bool]:
+        fingerprints_low = self._fingerprints_low
+        slot = low & self._mask
+        while True:
+            stored = fingerprints_low.item(slot)
+            if stored == _EMPTY:
+                return slot, False
+            if stored == low and (not self._wide or self._fingerprints_high.item(slot) == high):
+                return slot, True
+            slot = (slot + 1) & self._mask
+
+    def _locate(self, state: ProcessTreeState) -> Tuple[int, int, int, bool]:
+        """Returns the fingerprint, the slot (-1 if the Bloom filter ruled the state out) and whether it is stored."""
+        if state is self._last_state:
+            return self._last_location
+
+        low, high = self._fingerprint(state)
+        if self._bloom_filter is not None and low not in self._bloom_filter:
+            location = (low, high, -1, False)
+        else:
+            location = (low, high, *self._find_slot(low, high))
+
+        self._last_state = state
+        self._last_location = location
+        return location
+
+    def _grow(self):
+        occupied = np.nonzero(self._fingerprints_low)[0]
+        lows = self._fingerprints_low[occupied]
+        highs = self._fingerprints_high[occupied] if self._wide else None
+        distances = self._distances[occupied]
+        depths = self._depths[occupied]
+        transition_indices = self._transition_indices[occupied]
+        flags = self._flags[occupied]
+
+        self._allocate(2 * (self._mask + 1))
+        self._last_state = None
+        for i in range(len(occupied)):
+            low = lows.item(i)
+            slot, _ = self._find_slot(low, highs.item(i) if self._wide else 0)
+            self._fingerprints_low[slot] = low
+            if self._wide:
+                self._fingerprints_high[slot] = highs[i]
+            self._distances[slot] = distances[i]
+            self._depths[slot] = depths[i]
+            self._transition_indices[slot] = transition_indices[i]
+            self._flags[slot] = flags[i]
+
+    def _transition_index(self, transition: Optional[Transition]) -> int:
+        if transition is None:
+            return _NO_TRANSITION
+        index = self._transition_ids.get(transition)
+        if index is None:
+            index = self._transition_ids[transition] = len(self._transitions)
+            self._transitions.append(transition)
+        return index
+
+    def __contains__(self, state: ProcessTreeState) -> bool:
+        return self._locate(state)[3]
+
+    def __getitem__(self, state: ProcessTreeState) -> Tuple[float, SearchState]:
+        _, _, slot, found = self._locate(state)
+        if not found:
+            raise KeyError(state)
+
+        flags = self._flags.item(slot)
+        transition_index = self._transition_indices.item(slot)
+        transition = self._transitions[transition_index] if transition_index != _NO_TRANSITION else None
+        search_state = SearchState(
+            dist=self._distances.item(slot),
+            depth=self._depths.item(slot),
+            tree_state=state,
+            from_start=bool(flags & _FROM_START),
+            transition=transition,
+            leaf_execution=transition.node if flags & _LEAF_EXECUTION else None,
+        )
+        return (_VISITED if flags & _VISITED_FLAG else search_state.dist), search_state
+
+    def __setitem__(self, state: ProcessTreeState, item: Tuple[float, SearchState]):
+        distance, search_state = item
+        low, high, slot, found = self._locate(state)
+
+        if not found:
+            if self._size + 1 > self._max_load_factor * (self._mask + 1):
+                self._grow()
+                slot = -1
+            if slot < 0:
+                slot, _ = self._find_slot(low, high)
+            self._fingerprints_low[slot] = low
+            if self._wide:
+                self._fingerprints_high[slot] = high
+            if self._bloom_filter is not None:
+                self._bloom_filter.add(low)
+            self._size += 1
+            self._last_state = state
+            self._last_location = (low, high, slot, True)
+
+        self._distances[slot] = search_state.dist
+        self._depths[slot] = search_state.depth
+        self._transition_indices[slot] = self._transition_index(search_state.transition)
+        self._flags[slot] = (
+            (_VISITED_FLAG if distance == _VISITED else 0)
+            | (_FROM_START if search_state.from_start else 0)
+            | (_LEAF_EXECUTION if search_state.leaf_execution is not None else 0)
+        )
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the slot arrays and the Bloom filter."""
+        arrays = [
+            self._fingerprints_low,
+            self._distances,
+            self._depths,
+            self._transition_indices,
+            self._flags,
+        ]
+        if self._wide:
+            arrays.append(self._fingerprints_high)
+        nbytes = sum(array.nbytes for array in arrays)
+        if self._bloom_filter is not None:
+            nbytes += self._bloom_filter.nbytes
+        return nbytes
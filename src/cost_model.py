@@ -0,0 +1,68 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Union
+
+from process_tree import ProcessTree
+from semantics import Transition
+
+
+class TransitionCostModel(ABC):
+    # every transition costs the same, so equal states reached in one step are interchangeable
+    is_uniform: bool = False
+    # every cost is 0 or 1, so the open sets can be 0-1 BFS deques instead of heaps
+    is_zero_one: bool = False
+
+    @abstractmethod
+    def get_cost(self, transition: Transition, executed_leaf: Optional[ProcessTree]) -> float:
+        pass
+
+
+class UnitCostModel(TransitionCostModel):
+    is_uniform = True
+    is_zero_one = True
+
+    def get_cost(self, transition: Transition, executed_leaf: Optional[ProcessTree]) -> float:
+        return 1
+
+
+class LeafExecutionCostModel(TransitionCostModel):
+    """Charges leaf executions only, opening and closing operator nodes is free."""
+
+    is_zero_one = True
+
+    def get_cost(self, transition: Transition, executed_leaf: Optional[ProcessTree]) -> float:
+        return 1 if executed_leaf is not None else 0
+
+
+class LabelWeightCostModel(TransitionCostModel):
+    def __init__(self, weights: Dict[str, float], default_weight: float = 1, silent_cost: float = 0):
+        if any(weight < 0 for weight in (*weights.values(), default_weight, silent_cost)):
+            raise ValueError("costs must not be negative")
+
+        self.weights = weights
+        self.default_weight = default_weight
+        self.silent_cost = silent_cost
+        self.is_zero_one = {*weights.values(), default_weight, silent_cost} <= {0, 1}
+
+    def get_cost(self, transition: Transition, executed_leaf: Optional[ProcessTree]) -> float:
+        if executed_leaf is None:
+            return self.silent_cost
+        return self.weights.get(executed_leaf.label, self.default_weight)
+
+
+COST_MODELS = {"unit": UnitCostModel, "leaf": LeafExecutionCostModel, "label": LabelWeightCostModel}
+
+
+def cost_model_from_spec(spec: Union[str, Dict[str, Any]]) -> TransitionCostModel:
+    """Builds a cost model from its name in COST_MODELS or from a dict with "name" and the model's arguments.
+
+    e.g. "leaf" or {"name": "label", "weights": {"a": 2}, "silent_cost": 0.5}
+    """
+    arguments = dict(spec) if isinstance(spec, dict) else {"name": spec}
+    name = arguments.pop("name", None)
+    if not isinstance(name, str) or name not in COST_MODELS:
+        raise ValueError(f"unknown cost model: {spec!r}, expected one of {', '.join(COST_MODELS)}")
+
+    try:
+        return COST_MODELS[name](**arguments)
+    except TypeError as exc:
+        raise ValueError(f"invalid arguments for cost model {name}: {exc}") from None
@@ -0,0 +1,59 @@
+"""Measures how long a fresh interpreter takes to import the search core.
+
+Fails if importing the core pulls in an optional dependency or exceeds the time budget,
+e.g. ``python src/evaluation/import_time.py --max-ms 50``.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+CORE_MODULES = ("search", "semantics", "tree_state", "tree_utils", "process_tree", "node_state", "cli")
+HEAVY_MODULES = ("numpy", "pandas", "matplotlib", "seaborn", "PrettyPrint", "IPython", "asyncio", "multiprocessing")
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+for module in {modules!r}:
+    __import__(module)
+elapsed = time.perf_counter() - start
+heavy = sorted({{name.split(".")[0] for name in sys.modules}} & set({heavy!r}))
+print(json.dumps({{"seconds": elapsed, "heavy": heavy}}))
+"""
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(modules=CORE_MODULES, repeat: int = 5):
+    """Returns the fastest of ``repeat`` cold imports in seconds and the heavy modules they loaded."""
+    probe = _PROBE.format(modules=tuple(modules), heavy=HEAVY_MODULES)
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", probe], cwd=SRC_DIR, check=True, capture_output=True, text=True
+        ).stdout
+        runs.append(json.loads(output))
+    return min(run["seconds"] for run in runs), sorted({name for run in runs for name in run["heavy"]})
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-ms", type=float, default=100.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    seconds, heavy = measure(repeat=args.repeat)
+    print(f"import {', '.join(CORE_MODULES)}: {seconds * 1000:.1f} ms")
+
+    if heavy:
+        print(f"optional dependencies imported by the core: {', '.join(heavy)}")
+        return 1
+    if seconds * 1000 > args.max_ms:
+        print(f"slower than the budget of {args.max_ms:.0f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
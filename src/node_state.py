@@ -6,6 +6,9 @@ class NodeState(Enum):
     CLOSED = "Closed"
     FUTURE = "Future"
 
+    # members are singletons compared by identity, and Enum.__hash__ hashes the name in Python
+    __hash__ = object.__hash__
+
 
 def invert_node_state(node_state: NodeState):
     if node_state == NodeState.CLOSED:
@@ -0,0 +1,34 @@
+import heapq
+from collections import deque
+from typing import Union
+
+
+class HeapOpenSet(list):
+    """Binary heap ordered by SearchState.dist, used for arbitrary non-negative costs."""
+
+    def push(self, search_state):
+        heapq.heappush(self, search_state)
+
+    def pop_min(self):
+        return heapq.heappop(self)
+
+
+class ZeroOneOpenSet(deque):
+    """Deque for 0-1 BFS, only valid if every transition costs 0 or 1.
+
+    All states in the deque are within one unit of the front, so a state goes to the front
+    if it is not more expensive than the front and to the back otherwise.
+    """
+
+    def push(self, search_state):
+        if self and search_state.dist <= self[0].dist:
+            self.appendleft(search_state)
+        else:
+            self.append(search_state)
+
+    def pop_min(self):
+        return self.popleft()
+
+
+# the search picks one of the two depending on its cost model
+OpenSet = Union[HeapOpenSet, ZeroOneOpenSet]
@@ -0,0 +1,366 @@
+import heapq
+import math
+import multiprocessing
+import os
+import pickle
+import queue
+import traceback
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, Generic, List, Optional, Set, Tuple, Type, TypeVar
+
+from cost_model import TransitionCostModel, UnitCostModel
+from node_state import NodeState
+from process_tree import ProcessTree
+from search import PtStateSpaceSearch, SearchResult, SearchState, SearchStatistics
+from semantics import Transition
+from tree_state import ProcessTreeState
+from tree_utils import get_nodes_as_set
+
+PT = TypeVar("PT", bound="ProcessTree")
+
+# (node position, from state, to state, executes leaf) - transitions travel by position
+# because pickling a node would pickle the whole tree
+TransitionKey = Tuple[int, NodeState, NodeState, bool]
+# (state, distance, parent state, transition into state)
+Entry = Tuple[ProcessTreeState, float, Optional[ProcessTreeState], Optional[TransitionKey]]
+
+_BATCH = "batch"
+_TRACE = "trace"
+_STOP = "stop"
+_ERROR = "error"
+
+# layout of the shared counter array
+_SENT = 0
+_RECEIVED = 1
+_IDLE_OFFSET = 2
+
+_POLL_INTERVAL = 0.01
+# how long to wait for the exception of a worker that has exited
+_ERROR_TIMEOUT = 1.0
+
+
+class WorkerError(RuntimeError):
+    """Set as the cause of an exception raised by a worker, carrying the worker's traceback."""
+
+
+def get_owner(state: ProcessTreeState, num_workers: int) -> int:
+    # hash() of enums is salted per process, so ownership is derived from the repr instead
+    return zlib.crc32(repr(state).encode()) % num_workers
+
+
+class _Worker:
+    def __init__(
+        self,
+        worker_id: int,
+        search: PtStateSpaceSearch,
+        inboxes: List[multiprocessing.Queue],
+        results: multiprocessing.Queue,
+        counters,
+        visited_states,
+        best_cost,
+        stop_event,
+        batch_size: int,
+    ):
+        self.worker_id = worker_id
+        self.search = search
+        self.inboxes = inboxes
+        self.results = results
+        self.counters = counters
+        self.visited_states = visited_states
+        self.best_cost = best_cost
+        self.stop_event = stop_event
+        self.batch_size = batch_size
+
+        self.open_set: List[SearchState] = []
+        self.distances: Dict[ProcessTreeState, Tuple[float, Optional[ProcessTreeState], Optional[TransitionKey]]] = {}
+        self.expanded: Set[ProcessTreeState] = set()
+        self.outgoing: List[List[Entry]] = [[] for _ in inboxes]
+        self.local_best = math.inf
+        self.stopped = False
+
+    def run(self):
+        while not self.stop_event.is_set() and not self.stopped:
+            self.local_best = self.best_cost.value
+            self._drain_inbox()
+
+            if self._has_work():
+                for _ in range(self.batch_size):
+                    if not self._has_work():
+                        break
+                    self._expand()
+                self._flush()
+            else:
+                self._flush()
+                self._set_idle()
+                self._wait_for_message()
+
+        self._serve_traces()
+
+    def _has_work(self) -> bool:
+        return bool(self.open_set) and self.open_set[0].dist < self.local_best
+
+    def _set_idle(self):
+        with self.counters.get_lock():
+            self.counters[_IDLE_OFFSET + self.worker_id] = 1
+
+    def _drain_inbox(self):
+        while True:
+            try:
+                message = self.inboxes[self.worker_id].get_nowait()
+            except queue.Empty:
+                return
+            self._handle(message)
+
+    def _wait_for_message(self):
+        try:
+            message = self.inboxes[self.worker_id].get(timeout=_POLL_INTERVAL)
+        except queue.Empty:
+            return
+        self._handle(message)
+
+    def _handle(self, message):
+        kind, payload = message
+        if kind == _STOP:
+            self.stopped = True
+            return
+        if kind == _TRACE:
+            _, parent, transition_key = self.distances[payload]
+            self.results.put((_TRACE, (parent, transition_key)))
+            return
+
+        with self.counters.get_lock():
+            self.counters[_RECEIVED] += 1
+            self.counters[_IDLE_OFFSET + self.worker_id] = 0
+
+        for entry in payload:
+            self._accept(*entry)
+
+    def _accept(
+        self,
+        state: ProcessTreeState,
+        dist: float,
+        parent: Optional[ProcessTreeState],
+        transition_key: Optional[TransitionKey],
+    ):
+        if dist >= self.local_best:
+            return
+        if state in self.distances and self.distances[state][0] <= dist:
+            return
+
+        self.distances[state] = (dist, parent, transition_key)
+        self.expanded.discard(state)
+        heapq.heappush(
+            self.open_set,
+            SearchState(dist=dist, depth=0, tree_state=state, from_start=True),
+        )
+
+        if state.all_descendants_closed(self.search.tree):
+            with self.best_cost.get_lock():
+                if dist < self.best_cost.value:
+                    self.best_cost.value = dist
+            self.local_best = min(self.local_best, dist)
+
+    def _expand(self):
+        search_state = heapq.heappop(self.open_set)
+        state = search_state.tree_state
+
+        # stale heap entry or already expanded
+        if self.distances[state][0] < search_state.dist or state in self.expanded:
+            return
+        self.expanded.add(state)
+        self.visited_states[self.worker_id] += 1
+
+        num_workers = len(self.inboxes)
+        for new_state in self.search._successors(search_state, expand_forward=True):
+            transition = new_state.transition
+            entry = (
+                new_state.tree_state,
+                new_state.dist,
+                state,
+                (
+                    transition.node.position,
+                    transition.from_state,
+                    transition.to_state,
+                    new_state.leaf_execution is not None,
+                ),
+            )
+            owner = get_owner(new_state.tree_state, num_workers)
+            if owner == self.worker_id:
+                self._accept(*entry)
+            else:
+                self.outgoing[owner].append(entry)
+                if len(self.outgoing[owner]) >= self.batch_size:
+                    self._send(owner)
+
+    def _send(self, owner: int):
+        with self.counters.get_lock():
+            self.counters[_SENT] += 1
+        self.inboxes[owner].put((_BATCH, self.outgoing[owner]))
+        self.outgoing[owner] = []
+
+    def _flush(self):
+        for owner, entries in enumerate(self.outgoing):
+            if entries:
+                self._send(owner)
+
+    def _serve_traces(self):
+        while not self.stopped:
+            self._handle(self.inboxes[self.worker_id].get())
+
+
+def _run_worker(worker_id: int, tree, state_class, cost_model, inboxes, results, *args):
+    try:
+        search = PtStateSpaceSearch(tree, state_class, cost_model=cost_model)
+        search.init_data_structures()
+        _Worker(worker_id, search, inboxes, results, *args).run()
+    except Exception as exc:
+        try:
+            pickle.loads(pickle.dumps(exc))
+        except Exception:
+            exc = RuntimeError(repr(exc))
+        results.put((_ERROR, (exc, f"worker {worker_id} failed:\n{traceback.format_exc()}")))
+
+
+@dataclass
+class HashDistributedSearch(Generic[PT]):
+    """Unidirectional search whose states are distributed over worker processes by hash (HDA*).
+
+    Every state is owned by the worker selected by ``get_owner``. Generated states are sent
+    to their owner in batches, and the search stops once all workers are idle and no batch
+    is in flight. If a worker raises, ``search`` raises the same exception, caused by a
+    WorkerError with the worker's traceback.
+    """
+
+    tree: PT
+    state_class: Type[ProcessTreeState[PT]]
+    num_workers: int = os.cpu_count() or 1
+    batch_size: int = 64
+    cost_model: TransitionCostModel = field(default_factory=UnitCostModel)
+
+    def search(self) -> Optional[SearchResult]:
+        context = multiprocessing.get_context()
+        inboxes = [context.Queue() for _ in range(self.num_workers)]
+        results = context.Queue()
+        counters = context.Array("q", _IDLE_OFFSET + self.num_workers)
+        visited_states = context.Array("q", self.num_workers, lock=False)
+        best_cost = context.Value("d", math.inf)
+        stop_event = context.Event()
+
+        workers = [
+            context.Process(
+                target=_run_worker,
+                args=(
+                    worker_id,
+                    self.tree,
+                    self.state_class,
+                    self.cost_model,
+                    inboxes,
+                    results,
+                    counters,
+                    visited_states,
+                    best_cost,
+                    stop_event,
+                    self.batch_size,
+                ),
+                daemon=True,
+            )
+            for worker_id in range(self.num_workers)
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            initial_state = self.state_class.get_initial_state(self.tree)
+            with counters.get_lock():
+                counters[_SENT] += 1
+            inboxes[get_owner(initial_state, self.num_workers)].put(
+                (_BATCH, [(initial_state, 0.0, None, None)])
+            )
+
+            self._wait_for_termination(counters, workers, results)
+            stop_event.set()
+
+            if best_cost.value == math.inf:
+                raise ValueError("Nothing found")
+
+            firing_sequence, leaf_sequence = self._trace(
+                initial_state.invert(), inboxes, results, workers
+            )
+        except BaseException:
+            # failed workers leave their inboxes unread, so nothing may wait for them to drain
+            for inbox in inboxes:
+                inbox.cancel_join_thread()
+            for worker in workers:
+                worker.terminate()
+            raise
+        finally:
+            stop_event.set()
+            for inbox in inboxes:
+                inbox.put((_STOP, None))
+            for worker in workers:
+                worker.join()
+
+        return SearchResult(
+            cost=best_cost.value,
+            firing_sequence=firing_sequence,
+            trace=None,
+            leaf_sequence=leaf_sequence,
+            search_stats=SearchStatistics(visited_state=sum(visited_states)),
+        )
+
+    def _wait_for_termination(self, counters, workers, results):
+        while True:
+            with counters.get_lock():
+                all_idle = all(counters[_IDLE_OFFSET:])
+                if all_idle and counters[_SENT] == counters[_RECEIVED]:
+                    return
+            # until the search ends, workers only send their exceptions
+            self._receive(results, workers, timeout=_POLL_INTERVAL)
+
+    def _receive(self, results, workers, timeout: float):
+        """Returns the next trace reply, or None after ``timeout``, raising the exception of a failed worker."""
+        try:
+            kind, payload = results.get(timeout=timeout)
+        except queue.Empty:
+            exited = [worker for worker in workers if worker.exitcode is not None]
+            if not exited:
+                return None
+            try:
+                kind, payload = results.get(timeout=_ERROR_TIMEOUT)
+            except queue.Empty:
+                raise WorkerError(f"worker exited with code {exited[0].exitcode}") from None
+
+        if kind == _ERROR:
+            exc, worker_traceback = payload
+            raise exc from WorkerError(worker_traceback)
+        return payload
+
+    def _trace(
+        self,
+        goal_state: ProcessTreeState,
+        inboxes: List[multiprocessing.Queue],
+        results: multiprocessing.Queue,
+        workers: List[multiprocessing.Process],
+    ) -> Tuple[List[Transition], List[ProcessTree]]:
+        nodes = {node.position: node for node in get_nodes_as_set(self.tree)}
+        firing_sequence = []
+        leaf_sequence = []
+
+        state = goal_state
+        while state is not None:
+            inboxes[get_owner(state, self.num_workers)].put((_TRACE, state))
+            reply = None
+            while reply is None:
+                reply = self._receive(results, workers, timeout=_POLL_INTERVAL)
+            parent, transition_key = reply
+            if transition_key is not None:
+                position, from_state, to_state, executes_leaf = transition_key
+                firing_sequence.append(Transition(nodes[position], from_state, to_state))
+                if executes_leaf:
+                    leaf_sequence.append(nodes[position])
+            state = parent
+
+        firing_sequence.reverse()
+        leaf_sequence.reverse()
+        return firing_sequence, leaf_sequence
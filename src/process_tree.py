@@ -1,6 +1,5 @@
 from enum import Enum
 from typing import List
-from PrettyPrint import PrettyPrintTree
 
 
 class Operator(Enum):
@@ -49,7 +48,10 @@ class ProcessTree:
     def position(self) -> int:
         return self._position
 
-    def print_tree(self): 
+    def print_tree(self):
+        # PrettyPrint is slow to import and only needed here
+        from PrettyPrint import PrettyPrintTree
+
         printer = PrettyPrintTree(
             lambda tree: tree.children, lambda tree: f"{tree.operator.value} ({tree.position})" if tree.operator is not None else tree.label
         )
@@ -1,11 +1,15 @@
-import heapq
+import dataclasses
+import os
 import sys
-from dataclasses import dataclass
-from typing import Dict, Generic, List, Optional, Set, Tuple, Type, TypeVar
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Generic, Iterator, List, Optional, Set, Tuple, Type, TypeVar
 
+from cost_model import TransitionCostModel, UnitCostModel
+from open_set import HeapOpenSet, OpenSet, ZeroOneOpenSet
 from process_tree import ProcessTree
+from node_state import invert_node_state
 from semantics import ProcessTreeSemanticsInvertible, Transition
-from tree_state import ProcessTreeState
+from tree_state import ProcessTreeState, TupleTreeState
 from tree_utils import get_reverse_tree, is_leaf
 
 PT = TypeVar('PT', bound='ProcessTree')
@@ -34,8 +38,9 @@ class SearchState:
 
 
 class SearchStateIterator:
-    def __init__(self, search_state):
+    def __init__(self, search_state, get_parent: Callable[[SearchState], Optional[SearchState]] = None):
         self.current_state = search_state
+        self.get_parent = get_parent or (lambda state: state.parent)
 
     def __iter__(self):
         return self
@@ -44,7 +49,7 @@ class SearchStateIterator:
         if self.current_state is None:
             raise StopIteration
         state = self.current_state
-        self.current_state = state.parent
+        self.current_state = self.get_parent(state)
         return state
 
 
@@ -57,8 +62,8 @@ class MeetingInfo:
 
 @dataclass
 class SearchDataStructures:
-    open_set_forward: List[SearchState]
-    open_set_backward: List[SearchState]
+    open_set_forward: OpenSet
+    open_set_backward: OpenSet
     distances_forward: Dict[ProcessTreeState[ProcessTree], Tuple[float, SearchState]]
     distances_backward: Dict[ProcessTreeState[ProcessTree], Tuple[float, SearchState]]
     meeting_info: MeetingInfo
@@ -77,26 +82,70 @@ class SearchResult:
     leaf_sequence: List[ProcessTree]
     search_stats: SearchStatistics
 
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "cost": self.cost,
+            "leaf_sequence": [leaf.label for leaf in self.leaf_sequence],
+            **dataclasses.asdict(self.search_stats),
+        }
+
 
 @dataclass
 class PtStateSpaceSearch(Generic[PT]):
     tree: PT
     state_class: Type[ProcessTreeState[PT]]
+    # store backward states in forward coordinates so that matching needs no invert()
+    backward_in_forward_coordinates: bool = False
+    # e.g. functools.partial(CompactDistanceMap, fingerprint_bits=128) to trade exactness for memory
+    distance_map_factory: Callable[
+        [], Dict[ProcessTreeState[ProcessTree], Tuple[float, SearchState]]
+    ] = dict
+    # expand whole equal-cost layers with vectorised guards, requires TupleTreeState and numpy
+    batch_expansion: bool = False
+    # resume from this file if it exists, overwrite it every checkpoint_interval expansions
+    # and remove it once the search has finished
+    checkpoint_path: Optional[str] = None
+    checkpoint_interval: int = 100_000
+    cost_model: TransitionCostModel = field(default_factory=UnitCostModel)
 
     _reverse_tree: ProcessTree = None
+    _batch_semantics_forward: "BatchProcessTreeSemantics" = None
+    _batch_semantics_backward: "BatchProcessTreeSemantics" = None
+    # keys of the expanded states, so that batch expansion drops them before building objects
+    _expanded_keys_forward: "StateKeySet" = None
+    _expanded_keys_backward: "StateKeySet" = None
     _search_data_structures: SearchDataStructures = None
     _search_statistics: SearchStatistics = None
+    # whether new states reference their parent, see _get_parent
+    _link_parents: bool = True
 
     def init_data_structures(self):
         self._reverse_tree = get_reverse_tree(self.tree)
 
+        if self.batch_expansion:
+            # imported lazily so that numpy is only needed for batch expansion
+            from batch_semantics import BatchProcessTreeSemantics, StateKeySet
+
+            if not issubclass(self.state_class, TupleTreeState):
+                raise ValueError("batch expansion requires TupleTreeState")
+            self._batch_semantics_forward = BatchProcessTreeSemantics(self.tree)
+            self._batch_semantics_backward = BatchProcessTreeSemantics(self._reverse_tree)
+            self._expanded_keys_forward = StateKeySet()
+            self._expanded_keys_backward = StateKeySet()
+
         sds = SearchDataStructures(
-            open_set_backward=[],
-            open_set_forward=[],
-            distances_backward={},
-            distances_forward={},
+            open_set_backward=self._new_open_set(),
+            open_set_forward=self._new_open_set(),
+            distances_backward=self.distance_map_factory(),
+            distances_forward=self.distance_map_factory(),
             meeting_info=MeetingInfo(),
         )
+        # maps that do not store search states rebuild them on lookup, so a parent
+        # reference would only keep expanded states alive
+        self._link_parents = getattr(sds.distances_forward, "stores_search_states", True)
+        # fail before any expansion rather than at the first checkpoint
+        if self.checkpoint_path is not None and not self._link_parents:
+            raise ValueError("checkpoints require a distance map that stores search states")
 
         initial_start_search_state = SearchState(
             dist=0.0,
@@ -104,71 +153,101 @@ class PtStateSpaceSearch(Generic[PT]):
             from_start=True,
             depth=0,
         )
+        initial_end_tree_state = self.state_class.get_initial_state(self._reverse_tree)
+        if self.backward_in_forward_coordinates:
+            initial_end_tree_state = initial_end_tree_state.invert()
+
         initial_end_search_state = SearchState(
             dist=0.0,
-            tree_state=self.state_class.get_initial_state(self._reverse_tree),
+            tree_state=initial_end_tree_state,
             from_start=False,
             depth=0,
         )
 
-        heapq.heappush(sds.open_set_forward, initial_start_search_state)
-        heapq.heappush(sds.open_set_backward, initial_end_search_state)
+        sds.open_set_forward.push(initial_start_search_state)
+        sds.open_set_backward.push(initial_end_search_state)
 
         self._search_data_structures = sds
         self._search_statistics = SearchStatistics()
 
+    def _new_open_set(self) -> OpenSet:
+        return ZeroOneOpenSet() if self.cost_model.is_zero_one else HeapOpenSet()
+
+    def save_checkpoint(self, path: str, unidirectional: bool = False):
+        from checkpoint import save_checkpoint
+
+        save_checkpoint(self, path, unidirectional)
+
+    def load_checkpoint(self, path: str, unidirectional: bool = False):
+        from checkpoint import load_checkpoint
+
+        load_checkpoint(self, path, unidirectional)
+
+    def _remove_checkpoint(self):
+        # a finished search must not be resumed by the next search using the same path
+        if self.checkpoint_path is not None and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    def _finish_search(self, state_start: SearchState, state_end: SearchState) -> SearchResult:
+        result = self._construct_search_result(state_start, state_end)
+        self._remove_checkpoint()
+        return result
+
     def search(self, unidirectional=False) -> Optional[SearchResult]:
-        self.init_data_structures()
+        expand = self._expand_batch if self.batch_expansion else self._expand
+
+        if self.checkpoint_path is not None and os.path.exists(self.checkpoint_path):
+            self.load_checkpoint(self.checkpoint_path, unidirectional)
+        else:
+            self.init_data_structures()
+
+            # perform initial transition in both directions
+            expand(expand_forward=True)
+            expand(expand_forward=False)
+
         sds = self._search_data_structures
-        open_set_forward: List[SearchState] = sds.open_set_forward
-        open_set_backward: List[SearchState] = sds.open_set_backward
+        open_set_forward: OpenSet = sds.open_set_forward
+        open_set_backward: OpenSet = sds.open_set_backward
         meeting_info: MeetingInfo = sds.meeting_info
 
         expand_forward = True
         lock_direction = unidirectional
-
-        # perform initial transition in both directions
-        self._expand(expand_forward=True)
-        self._expand(expand_forward=False)
+        expansions = 0
 
         while len(open_set_forward) > 0 or len(open_set_backward) > 0:
             prio_queue_start = open_set_forward[0].dist if open_set_forward else 0
             prio_queue_end = open_set_backward[0].dist if open_set_backward else 0
 
-            if meeting_info.start_node is not None:
-                return self._construct_search_result(
+            # with non-uniform costs the first meeting need not be the cheapest one
+            if meeting_info.start_node is not None and self.cost_model.is_uniform:
+                return self._finish_search(
                     meeting_info.start_node, meeting_info.end_node
                 )
 
             if prio_queue_end + prio_queue_start >= meeting_info.best_path_cost:
-                return self._construct_search_result(
+                return self._finish_search(
                     meeting_info.start_node, meeting_info.end_node
                 )
 
-            self._expand(expand_forward=expand_forward)
+            expand(expand_forward=expand_forward)
             expand_forward = not expand_forward or lock_direction
 
-        raise ValueError("Nothing found")
-
-    def _expand(self, expand_forward: bool):
-        tree = self.tree if expand_forward else self._reverse_tree
-
-        open_set = (
-            self._search_data_structures.open_set_forward
-            if expand_forward
-            else self._search_data_structures.open_set_backward
-        )
-        distance_map = (
-            self._search_data_structures.distances_forward
-            if expand_forward
-            else self._search_data_structures.distances_backward
-        )
+            expansions += 1
+            if self.checkpoint_path is not None and expansions % self.checkpoint_interval == 0:
+                self.save_checkpoint(self.checkpoint_path, unidirectional)
 
-        if not open_set:
-            return
+        self._remove_checkpoint()
+        raise ValueError("Nothing found")
 
-        search_state = heapq.heappop(open_set)
+    def _get_open_set_and_distance_map(
+        self, expand_forward: bool
+    ) -> Tuple[OpenSet, Dict[ProcessTreeState[ProcessTree], Tuple[float, SearchState]]]:
+        sds = self._search_data_structures
+        if expand_forward:
+            return sds.open_set_forward, sds.distances_forward
+        return sds.open_set_backward, sds.distances_backward
 
+    def _mark_visited(self, search_state: SearchState, distance_map) -> bool:
         cost_so_far = (
             distance_map[search_state.tree_state][0]
             if search_state.tree_state in distance_map
@@ -177,55 +256,156 @@ class PtStateSpaceSearch(Generic[PT]):
 
         # state has already been visited
         if cost_so_far == -sys.maxsize:
-            return
+            return False
         self._search_statistics.visited_state += 1
 
         # mark as visited
         distance_map[search_state.tree_state] = (-sys.maxsize, search_state)
+        return True
+
+    def _add_to_open_set(self, new_state: SearchState, open_set, distance_map):
+        if (
+            new_state.tree_state not in distance_map
+            or distance_map[new_state.tree_state][0] > new_state.dist
+        ):
+            open_set.push(new_state)
+            distance_map[new_state.tree_state] = (new_state.dist, new_state)
+            self._check_for_match(new_state)
+
+    def _expand(self, expand_forward: bool):
+        open_set, distance_map = self._get_open_set_and_distance_map(expand_forward)
+
+        if not open_set:
+            return
+
+        search_state = open_set.pop_min()
+
+        if not self._mark_visited(search_state, distance_map):
+            return
+
+        for new_state in self._successors(search_state, expand_forward):
+            self._add_to_open_set(new_state, open_set, distance_map)
+
+    def _expand_batch(self, expand_forward: bool):
+        from batch_semantics import CLOSED_CODE, decode_states, encode_states, state_keys
+
+        open_set, distance_map = self._get_open_set_and_distance_map(expand_forward)
+
+        if not open_set:
+            return
+
+        layer_dist = open_set[0].dist
+        layer: List[SearchState] = []
+        while open_set and open_set[0].dist == layer_dist:
+            search_state = open_set.pop_min()
+            if self._mark_visited(search_state, distance_map):
+                layer.append(search_state)
+
+        if not layer:
+            return
+
+        if expand_forward:
+            semantics, expanded_keys = self._batch_semantics_forward, self._expanded_keys_forward
+        else:
+            semantics, expanded_keys = self._batch_semantics_backward, self._expanded_keys_backward
+        in_forward_coordinates = self.backward_in_forward_coordinates and not expand_forward
+
+        states = encode_states([search_state.tree_state for search_state in layer])
+        expanded_keys.add(state_keys(states))
+        if in_forward_coordinates:
+            states = CLOSED_CODE - states
+
+        successors, parents, positions, kinds = semantics.get_successors(
+            states, unique=self.cost_model.is_uniform
+        )
+        if in_forward_coordinates:
+            successors = CLOSED_CODE - successors
+
+        # expanded states are never reopened, so they are dropped before any object is built
+        unexpanded = ~expanded_keys.contains(state_keys(successors))
+
+        for parent_index, position, kind, tree_state in zip(
+            parents[unexpanded].tolist(),
+            positions[unexpanded].tolist(),
+            kinds[unexpanded].tolist(),
+            decode_states(successors[unexpanded]),
+        ):
+            parent = layer[parent_index]
+            transition = semantics.transitions[kind][position]
+            cost, executed_leaf = self._get_transition_cost(transition, expand_forward)
+
+            new_state = SearchState(
+                dist=parent.dist + cost,
+                tree_state=tree_state,
+                from_start=expand_forward,
+                leaf_execution=executed_leaf,
+                parent=parent if self._link_parents else None,
+                transition=transition,
+                depth=parent.depth + 1,
+            )
+            self._add_to_open_set(new_state, open_set, distance_map)
+
+    def _get_transition_cost(
+        self, transition: Transition, expand_forward: bool
+    ) -> Tuple[float, Optional[ProcessTree]]:
+        executed_leaf = None
+
+        if is_leaf(transition.node):
+            is_forward_exec = transition.is_future_to_open() and expand_forward
+            is_backward_exec = transition.is_open_to_closed() and not expand_forward
+
+            if is_forward_exec or is_backward_exec:
+                executed_leaf = transition.node
+
+        return self.cost_model.get_cost(transition, executed_leaf), executed_leaf
+
+    def _successors(
+        self, search_state: SearchState, expand_forward: bool
+    ) -> Iterator[SearchState]:
+        tree = self.tree if expand_forward else self._reverse_tree
+
+        in_forward_coordinates = self.backward_in_forward_coordinates and not expand_forward
+        # one invert() per expansion replaces one per generated state in _check_for_match
+        semantics_state = (
+            search_state.tree_state.invert()
+            if in_forward_coordinates
+            else search_state.tree_state
+        )
 
         enabled_transitions: Set[Transition] = ProcessTreeSemanticsInvertible.get_valid_transitions(
-                tree, search_state.tree_state
+                tree, semantics_state
             )
-        
-        for transition in enabled_transitions:
-            cost = 1
-            executed_leaf = None
 
-            if is_leaf(transition.node):
-                is_forward_exec = transition.is_future_to_open() and expand_forward
-                is_backward_exec = transition.is_open_to_closed() and not expand_forward
+        for transition in enabled_transitions:
+            cost, executed_leaf = self._get_transition_cost(transition, expand_forward)
 
-                if is_forward_exec or is_backward_exec:
-                    cost = 1
-                    executed_leaf = transition.node
+            to_state = (
+                invert_node_state(transition.to_state)
+                if in_forward_coordinates
+                else transition.to_state
+            )
 
-            new_state = SearchState(
+            yield SearchState(
                 dist=search_state.dist + cost,
-                tree_state=search_state.tree_state.update(
-                    transition.node, transition.to_state
-                ),
+                tree_state=search_state.tree_state.update(transition.node, to_state),
                 from_start=expand_forward,
                 leaf_execution=executed_leaf,
-                parent=search_state,
+                parent=search_state if self._link_parents else None,
                 transition=transition,
                 depth=search_state.depth + 1,
-                previous_valid_transitions=enabled_transitions,
+                previous_valid_transitions=enabled_transitions if self._link_parents else None,
             )
 
-            if (
-                new_state.tree_state not in distance_map
-                or distance_map[new_state.tree_state][0] > new_state.dist
-            ):
-                heapq.heappush(open_set, new_state)
-                distance_map[new_state.tree_state] = (new_state.dist, new_state)
-                self._check_for_match(new_state)
-
     def _check_for_match(self, search_state: SearchState):
         sds = self._search_data_structures
         distance_map_other_dir = (
             sds.distances_backward if search_state.from_start else sds.distances_forward
         )
-        inverse_state = search_state.tree_state.invert()
+        inverse_state = (
+            search_state.tree_state
+            if self.backward_in_forward_coordinates
+            else search_state.tree_state.invert()
+        )
 
         if inverse_state in distance_map_other_dir:
             match: SearchState = distance_map_other_dir[inverse_state][1]
@@ -238,12 +418,24 @@ class PtStateSpaceSearch(Generic[PT]):
                     search_state if not search_state.from_start else match
                 )
 
+    def _get_parent(self, search_state: SearchState) -> Optional[SearchState]:
+        if search_state.parent is not None or search_state.transition is None:
+            return search_state.parent
+
+        # the parent is the state before the transition, and it is in the distance map as it was expanded
+        from_state = search_state.transition.from_state
+        if self.backward_in_forward_coordinates and not search_state.from_start:
+            from_state = invert_node_state(from_state)
+        _, distance_map = self._get_open_set_and_distance_map(search_state.from_start)
+        parent_tree_state = search_state.tree_state.update(search_state.transition.node, from_state)
+        return distance_map[parent_tree_state][1]
+
     def _construct_search_result(
         self, state_start: SearchState, state_end: SearchState
     ):
-        search_state_sequence_start = list(SearchStateIterator(state_start))
+        search_state_sequence_start = list(SearchStateIterator(state_start, self._get_parent))
         search_state_sequence_start.reverse()
-        search_state_sequence_end = list(SearchStateIterator(state_end))
+        search_state_sequence_end = list(SearchStateIterator(state_end, self._get_parent))
 
         firing_sequence_start = [
             state.transition
@@ -0,0 +1,265 @@
+import argparse
+import asyncio
+import dataclasses
+import functools
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from cost_model import cost_model_from_spec
+from search import PtStateSpaceSearch
+from tree_state import TupleTreeState
+from tree_utils import parse_tree_string
+
+# PtStateSpaceSearch fields that requests may set, cost_model as a cost_model_from_spec spec
+SEARCH_OPTIONS = ("backward_in_forward_coordinates", "batch_expansion", "cost_model")
+
+
+def run_search(tree_string: str, unidirectional: bool = False, **options) -> Dict[str, Any]:
+    unknown = set(options) - set(SEARCH_OPTIONS)
+    if unknown:
+        raise ValueError(f"unknown search options: {', '.join(sorted(unknown))}")
+    if "cost_model" in options:
+        options["cost_model"] = cost_model_from_spec(options["cost_model"])
+
+    search = PtStateSpaceSearch(parse_tree_string(tree_string), TupleTreeState, **options)
+    return search.search(unidirectional=unidirectional).to_dict()
+
+
+async def search_async(
+    tree_string: str,
+    unidirectional: bool = False,
+    executor: Optional[Executor] = None,
+    **options,
+) -> Dict[str, Any]:
+    """Runs a single search in ``executor`` (the loop's default executor if omitted) without blocking the loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor, functools.partial(run_search, tree_string, unidirectional, **options)
+    )
+
+
+@dataclass
+class ServiceStatistics:
+    requests: int = 0
+    coalesced: int = 0
+    completed: int = 0
+    failed: int = 0
+    total_latency: float = 0.0
+    max_latency: float = 0.0
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def mean_latency(self) -> float:
+        return self.total_latency / self.completed if self.completed else 0.0
+
+    @property
+    def throughput(self) -> float:
+        return self.completed / max(time.monotonic() - self.started_at, 1e-9)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **dataclasses.asdict(self),
+            "mean_latency": self.mean_latency,
+            "throughput": self.throughput,
+        }
+
+
+def _worker_context():
+    # forked workers would inherit the sockets open at that moment, keeping clients from seeing them closed
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+RequestKey = Tuple[str, bool, Tuple[Tuple[str, str], ...]]
+
+
+class SearchService:
+    """Dispatches searches to a process pool.
+
+    Concurrent requests for the same tree and options share one search. At most
+    ``max_pending`` searches wait for a worker; further requests wait in ``search``.
+    Closing the service fails all searches that have not finished.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_pending: int = 64):
+        self.statistics = ServiceStatistics()
+        self.max_pending = max_pending
+        self._max_workers = max_workers or os.cpu_count() or 1
+        self._executor = ProcessPoolExecutor(self._max_workers, mp_context=_worker_context())
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._in_flight: Dict[RequestKey, asyncio.Future] = {}
+        self._dispatchers: List[asyncio.Task] = []
+        self._closed = False
+
+    async def __aenter__(self) -> "SearchService":
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def start(self):
+        self._dispatchers = [
+            asyncio.create_task(self._dispatch()) for _ in range(self._max_workers)
+        ]
+
+    async def close(self):
+        self._closed = True
+        # cancelled dispatchers drop their search from _in_flight, so the futures are collected first
+        pending = list(self._in_flight.values())
+        for dispatcher in self._dispatchers:
+            dispatcher.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+
+        for future in pending + list(self._in_flight.values()):
+            if not future.done():
+                future.set_exception(RuntimeError("search service is closed"))
+        # requests waiting for queue space get to put and then find their future failed
+        while not self._queue.empty():
+            self._queue.get_nowait()
+            await asyncio.sleep(0)
+
+        # running searches are abandoned rather than blocking the event loop until they finish
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def search(self, tree_string: str, unidirectional: bool = False, **options) -> Dict[str, Any]:
+        if self._closed:
+            raise RuntimeError("search service is closed")
+        # the parsed tree's repr normalises whitespace, and parsing rejects invalid trees early
+        key = (repr(parse_tree_string(tree_string)), unidirectional, _options_key(options))
+        self.statistics.requests += 1
+        start = time.monotonic()
+
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.statistics.coalesced += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._in_flight[key] = future
+            # other requests may already wait on the future, so cancelling this caller must not drop the search
+            await asyncio.shield(self._queue.put((key, future)))
+
+        try:
+            result = await asyncio.shield(future)
+        except Exception:
+            self.statistics.failed += 1
+            raise
+
+        latency = time.monotonic() - start
+        self.statistics.completed += 1
+        self.statistics.total_latency += latency
+        self.statistics.max_latency = max(self.statistics.max_latency, latency)
+        return result
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            key, future = await self._queue.get()
+            tree_string, unidirectional, options = key
+            try:
+                result = await loop.run_in_executor(
+                    self._executor, _run_search_with_options, tree_string, unidirectional, options
+                )
+            except Exception as exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+            finally:
+                del self._in_flight[key]
+                self._queue.task_done()
+
+
+def _options_key(options: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+    # option values such as cost model specs are dicts, so they are keyed by their canonical JSON
+    return tuple(sorted((name, json.dumps(value, sort_keys=True)) for name, value in options.items()))
+
+
+def _run_search_with_options(tree_string: str, unidirectional: bool, options: Tuple[Tuple[str, str], ...]):
+    return run_search(tree_string, unidirectional, **{name: json.loads(value) for name, value in options})
+
+
+async def _handle_request(service: SearchService, request: Dict[str, Any]) -> Dict[str, Any]:
+    if request.get("stats"):
+        return {"id": request.get("id"), "stats": service.statistics.to_dict()}
+    if not isinstance(request.get("tree"), str):
+        return {"id": request.get("id"), "error": 'invalid request: "tree" must be a string'}
+    if not isinstance(request.get("options", {}), dict):
+        return {"id": request.get("id"), "error": 'invalid request: "options" must be an object'}
+
+    try:
+        result = await service.search(
+            request["tree"],
+            unidirectional=request.get("unidirectional", False),
+            **request.get("options", {}),
+        )
+    except Exception as exc:
+        return {"id": request.get("id"), "error": str(exc)}
+    return {"id": request.get("id"), **result}
+
+
+async def _handle_connection(
+    service: SearchService, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+):
+    # requests on one connection are answered as they complete, so responses carry the request id
+    pending = set()
+    # reading stops while a connection has max_pending unanswered requests
+    slots = asyncio.Semaphore(service.max_pending)
+
+    async def respond(request):
+        try:
+            response = await _handle_request(service, request)
+            writer.write((json.dumps(response) + "\n").encode())
+            await writer.drain()
+        finally:
+            slots.release()
+
+    while line := await reader.readline():
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as exc:
+            writer.write((json.dumps({"error": f"invalid request: {exc}"}) + "\n").encode())
+            continue
+        if not isinstance(request, dict):
+            writer.write((json.dumps({"error": "invalid request: expected a JSON object"}) + "\n").encode())
+            continue
+        await slots.acquire()
+        task = asyncio.create_task(respond(request))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+
+    await asyncio.gather(*pending)
+    writer.close()
+    await writer.wait_closed()
+
+
+async def serve(host: str = "127.0.0.1", port: int = 8765, max_workers: Optional[int] = None, max_pending: int = 64):
+    """Serves searches as JSON lines over TCP.
+
+    e.g. {"id": 1, "tree": "->('a','b')"}, {"id": 2, "tree": "X('a','b')", "options": {"cost_model": "leaf"}}
+    or {"stats": true}
+    """
+    async with SearchService(max_workers, max_pending) as service:
+        server = await asyncio.start_server(
+            lambda reader, writer: _handle_connection(service, reader, writer), host, port
+        )
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process tree state space search service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-pending", type=int, default=64)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port, args.workers, args.max_pending))
+
+
+if __name__ == "__main__":
+    main()
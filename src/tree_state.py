@@ -2,13 +2,15 @@ from abc import ABC, abstractmethod
 import dataclasses
 from typing import Generic, Tuple, TypeVar
 
-from node_state import NodeState, char_to_node_state
+from node_state import NodeState, char_to_node_state, invert_node_state
 from process_tree import ProcessTree
 from tree_utils import get_nodes_as_set
 
 
 PT = TypeVar("PT", bound="ProcessTree")
 
+_INVERTED = {node_state: invert_node_state(node_state) for node_state in NodeState}
+
 
 class ProcessTreeState(ABC, Generic[PT]):
     @abstractmethod
@@ -49,7 +51,6 @@ class ProcessTreeState(ABC, Generic[PT]):
         return self.all_descendants_in_state(tree, NodeState.CLOSED)
 
 
-
 @dataclasses.dataclass(frozen=True)
 class TupleTreeState(ProcessTreeState[ProcessTree]):
 
@@ -66,11 +67,7 @@ class TupleTreeState(ProcessTreeState[ProcessTree]):
         return dataclasses.replace(self, state_list=tuple(new_state_list))
 
     def invert(self) -> "TupleTreeState":
-        new_state_list = [
-            state if state == NodeState.OPEN else (NodeState.FUTURE if state == NodeState.CLOSED else NodeState.CLOSED)
-            for state in list(self.state_list)
-        ]
-        return dataclasses.replace(self, state_list=tuple(new_state_list))
+        return dataclasses.replace(self, state_list=tuple(map(_INVERTED.__getitem__, self.state_list)))
 
     @classmethod
     def get_initial_state(cls, tree: ProcessTree) -> "TupleTreeState":
@@ -0,0 +1,23 @@
+import pytest
+
+# small enough for every search mode and cost model to finish quickly
+TREES = [
+    "->('a','b')",
+    "X('a',->('b','c'),'d')",
+    "+(->('a','b','c'),X('d','e'),*('f','g'))",
+    "*(->('a',X('b','c')),+('d','e'))",
+    "<-('a',*('b','c'),X('d',+('e','f')))",
+    "X(*(<-('a','b'),'c'),+(*('d','e'),->('f','g')))",
+]
+# searching this one takes seconds, so it is only used where states are checked one by one
+LARGE_TREE = "+(->('a','b','c'),X('d','e'),*('f','g'),->('h',+('i','j')),'k')"
+
+
+@pytest.fixture(params=TREES)
+def tree_string(request) -> str:
+    return request.param
+
+
+@pytest.fixture(params=[*TREES, LARGE_TREE])
+def any_tree_string(request) -> str:
+    return request.param
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from batch_semantics import DECODE, TRANSITION_KINDS, BatchProcessTreeSemantics, decode_states
+from semantics import ProcessTreeSemanticsInvertible
+from tree_utils import get_reverse_tree, parse_tree_string
+
+
+def _reference_transitions(tree, state):
+    return {
+        (transition.node.position, transition.from_state, transition.to_state)
+        for transition in ProcessTreeSemanticsInvertible.get_valid_transitions(tree, state)
+    }
+
+
+def _batch_transitions(enabled, row):
+    return {
+        (position, DECODE[from_code], DECODE[to_code])
+        for (from_code, to_code), matrix in zip(TRANSITION_KINDS, enabled)
+        for position in np.nonzero(matrix[row])[0].tolist()
+    }
+
+
+@pytest.mark.parametrize("reverse", [False, True])
+def test_get_valid_transitions_matches_reference_on_random_states(any_tree_string, reverse):
+    tree = parse_tree_string(any_tree_string)
+    if reverse:
+        tree = get_reverse_tree(tree)
+    semantics = BatchProcessTreeSemantics(tree)
+
+    rng = np.random.default_rng(len(any_tree_string))
+    states = rng.integers(0, 3, size=(1000, len(semantics.nodes)), dtype=np.int8)
+    enabled = semantics.get_valid_transitions(states)
+
+    for row, state in enumerate(decode_states(states)):
+        assert _batch_transitions(enabled, row) == _reference_transitions(tree, state), state
@@ -0,0 +1,124 @@
+import os
+import tracemalloc
+
+import pytest
+
+import checkpoint  # noqa: F401, imported here so that tracing a save does not count the import
+from compact_distance_map import CompactDistanceMap
+from cost_model import LabelWeightCostModel, LeafExecutionCostModel, UnitCostModel
+from search import PtStateSpaceSearch
+from tree_state import TupleTreeState
+from tree_utils import parse_tree_string
+
+TREE = "+(->('a','b','c'),X('d','e'),*('f','g'),->('h','i'))"
+
+
+class Interrupted(Exception):
+    pass
+
+
+class InterruptedSearch(PtStateSpaceSearch):
+    """Stops right after writing the first checkpoint, as if the process had been killed."""
+
+    def save_checkpoint(self, path, unidirectional=False):
+        super().save_checkpoint(path, unidirectional)
+        raise Interrupted
+
+
+def _interrupt(path, tree_string=TREE, unidirectional=False, **options):
+    search = InterruptedSearch(parse_tree_string(tree_string), TupleTreeState, checkpoint_path=path, **options)
+    with pytest.raises(Interrupted):
+        search.search(unidirectional=unidirectional)
+
+
+@pytest.mark.parametrize("unidirectional", [False, True])
+@pytest.mark.parametrize("batch_expansion", [False, True])
+@pytest.mark.parametrize(
+    "cost_model",
+    [UnitCostModel(), LeafExecutionCostModel(), LabelWeightCostModel({"a": 2, "h": 3}, silent_cost=0.5)],
+    ids=["unit", "leaf", "label"],
+)
+def test_resumed_search_finds_the_same_cost(tmp_path, unidirectional, batch_expansion, cost_model):
+    options = dict(batch_expansion=batch_expansion, cost_model=cost_model)
+    expected = PtStateSpaceSearch(parse_tree_string(TREE), TupleTreeState, **options).search(unidirectional)
+
+    path = str(tmp_path / "search.ckpt")
+    _interrupt(path, unidirectional=unidirectional, checkpoint_interval=5 if batch_expansion else 500, **options)
+    assert os.path.exists(path)
+
+    result = PtStateSpaceSearch(
+        parse_tree_string(TREE), TupleTreeState, checkpoint_path=path, **options
+    ).search(unidirectional)
+
+    assert result.cost == expected.cost
+    if cost_model.is_uniform:
+        # the path is rebuilt through the loaded distance maps
+        assert len(result.firing_sequence) == result.cost
+    assert not os.path.exists(path)
+
+
+def test_finished_search_removes_its_checkpoint(tmp_path):
+    path = str(tmp_path / "search.ckpt")
+    first = PtStateSpaceSearch(parse_tree_string("X('a','b')"), TupleTreeState, checkpoint_path=path)
+    first.search()
+    assert not os.path.exists(path)
+
+    second = PtStateSpaceSearch(parse_tree_string("+('x','y')"), TupleTreeState, checkpoint_path=path)
+    assert second.search().cost == PtStateSpaceSearch(parse_tree_string("+('x','y')"), TupleTreeState).search().cost
+
+
+@pytest.mark.parametrize(
+    "tree_string, options, unidirectional",
+    [
+        ("+(->('a','b','c'),X('d','e'),*('f','g'),->('h','j'))", {}, False),
+        (TREE, {"backward_in_forward_coordinates": True}, False),
+        (TREE, {"cost_model": LeafExecutionCostModel()}, False),
+        (TREE, {"batch_expansion": True}, False),
+        (TREE, {}, True),
+    ],
+)
+def test_checkpoint_of_other_tree_or_options_is_rejected(tmp_path, tree_string, options, unidirectional):
+    path = str(tmp_path / "search.ckpt")
+    _interrupt(path, checkpoint_interval=500)
+
+    search = PtStateSpaceSearch(parse_tree_string(tree_string), TupleTreeState, checkpoint_path=path, **options)
+    with pytest.raises(ValueError, match="different tree or different search options"):
+        search.search(unidirectional)
+
+
+def test_distance_map_without_search_states_is_rejected_before_searching(tmp_path):
+    search = PtStateSpaceSearch(
+        parse_tree_string(TREE),
+        TupleTreeState,
+        distance_map_factory=CompactDistanceMap,
+        checkpoint_path=str(tmp_path / "search.ckpt"),
+        checkpoint_interval=200,
+    )
+
+    with pytest.raises(ValueError, match="distance map that stores search states"):
+        search.search()
+    assert search._search_statistics is None
+
+
+def test_saving_needs_little_memory_besides_the_search(tmp_path):
+    measured = {}
+
+    class MeasuredSearch(PtStateSpaceSearch):
+        def save_checkpoint(self, path, unidirectional=False):
+            measured["live"] = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            super().save_checkpoint(path, unidirectional)
+            measured["peak"] = tracemalloc.get_traced_memory()[1]
+            raise Interrupted
+
+    search = MeasuredSearch(
+        parse_tree_string(TREE), TupleTreeState, checkpoint_path=str(tmp_path / "search.ckpt"), checkpoint_interval=1500
+    )
+    tracemalloc.start()
+    try:
+        with pytest.raises(Interrupted):
+            search.search()
+    finally:
+        tracemalloc.stop()
+
+    assert measured["peak"] - measured["live"] < 0.25 * measured["live"]
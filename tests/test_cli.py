@@ -0,0 +1,97 @@
+import json
+
+import pytest
+
+import cli
+from cli import main, parse_request
+
+
+def test_parse_request_accepts_plain_json_string_and_object_lines():
+    assert parse_request("->('a','b')") == (None, "->('a','b')")
+    assert parse_request(json.dumps("X('a','b')")) == (None, "X('a','b')")
+    assert parse_request(json.dumps({"id": 7, "tree": "+('a','b')"})) == (7, "+('a','b')")
+    assert parse_request(json.dumps({"tree": "'a'"})) == (None, "'a'")
+
+
+@pytest.mark.parametrize(
+    "line, message",
+    [
+        (json.dumps({"id": 1, "tree": 5}), '"tree" must be a string'),
+        (json.dumps({"id": 1, "tree": ["->('a','b')"]}), '"tree" must be a string'),
+        (json.dumps({"id": 1}), 'no "tree"'),
+    ],
+)
+def test_parse_request_rejects_objects_without_a_tree_string(line, message):
+    with pytest.raises(ValueError, match=message):
+        parse_request(line)
+
+
+def _run(tmp_path, lines, *options):
+    input_path = tmp_path / "trees.jsonl"
+    output_path = tmp_path / "results.jsonl"
+    input_path.write_text("".join(line + "\n" for line in lines))
+    exit_code = main([str(input_path), "-o", str(output_path), *options])
+    return exit_code, [json.loads(line) for line in output_path.read_text().splitlines()]
+
+
+def test_stream_continues_after_bad_lines(tmp_path):
+    lines = [
+        "->('a','b')",
+        "->('a',",
+        json.dumps({"id": "x", "tree": 5}),
+        "",
+        "[1, 2",
+        json.dumps({"id": "y", "tree": "X('a','b')"}),
+    ]
+
+    exit_code, responses = _run(tmp_path, lines)
+
+    assert exit_code == 1
+    assert [response["line"] for response in responses] == [1, 2, 3, 5, 6]
+    assert responses[0]["cost"] == 6
+    assert all("error" in response for response in responses[1:4])
+    assert responses[4]["id"] == "y"
+    assert "error" not in responses[4]
+
+
+def test_exit_code_is_zero_when_every_line_succeeds(tmp_path):
+    exit_code, responses = _run(tmp_path, ["->('a','b')", "X('a','b')"], "--cost-model", "leaf")
+
+    assert exit_code == 0
+    assert [response["cost"] for response in responses] == [2, 1]
+
+
+@pytest.mark.parametrize("strategy", ["bidirectional", "hash-distributed"])
+def test_label_weights(tmp_path, strategy):
+    weights = json.dumps({"a": 3, "b": 0.5})
+    options = ["--strategy", strategy, "--cost-model", "label", "--label-weights", weights, "--silent-cost", "0.25"]
+
+    exit_code, responses = _run(tmp_path, ["X('a','b')"], *options)
+
+    assert exit_code == 0
+    assert responses[0]["cost"] == 1.5
+    assert responses[0]["leaf_sequence"] == ["b"]
+
+
+@pytest.mark.parametrize("weights", ["[1, 2]", "{", json.dumps({"a": -1})])
+def test_invalid_label_weights_are_rejected_before_reading(weights):
+    with pytest.raises(SystemExit):
+        main(["missing.jsonl", "--cost-model", "label", "--label-weights", weights])
+
+
+def test_each_result_is_written_before_the_next_search(tmp_path, monkeypatch):
+    output_path = tmp_path / "results.jsonl"
+    written_before = []
+    run_search = cli.run_search
+
+    def recording_run_search(tree_string, args):
+        written_before.append(len(output_path.read_text().splitlines()))
+        return run_search(tree_string, args)
+
+    monkeypatch.setattr(cli, "run_search", recording_run_search)
+    input_path = tmp_path / "trees.jsonl"
+    input_path.write_text("->('a','b')\nX('a','b')\n+('a','b')\n")
+
+    assert main([str(input_path), "-o", str(output_path)]) == 0
+    assert written_before == [0, 1, 2]
+    assert len(output_path.read_text().splitlines()) == 3
@@ -0,0 +1,103 @@
+import functools
+import itertools
+import sys
+
+import pytest
+
+from compact_distance_map import CompactDistanceMap
+from node_state import NodeState
+from search import PtStateSpaceSearch, SearchState
+from tree_state import TupleTreeState
+from tree_utils import parse_tree_string
+
+# every state of a tree with 6 nodes, tree shape does not matter to the map
+STATES = [TupleTreeState(state_list) for state_list in itertools.product(list(NodeState), repeat=6)]
+
+MAPS = {
+    "64": functools.partial(CompactDistanceMap),
+    "128": functools.partial(CompactDistanceMap, fingerprint_bits=128),
+    "bloom": functools.partial(CompactDistanceMap, fingerprint_bits=128, bloom_filter_capacity=len(STATES)),
+}
+
+
+def _search_state(tree_state, dist, from_start=True):
+    return SearchState(dist=dist, depth=int(dist), tree_state=tree_state, from_start=from_start)
+
+
+@pytest.mark.parametrize("factory", MAPS.values(), ids=MAPS.keys())
+def test_lookups_survive_growing_past_the_initial_capacity(factory):
+    distance_map = factory(initial_capacity=8)
+    stored = STATES[::2]
+    for i, tree_state in enumerate(stored):
+        distance_map[tree_state] = (float(i), _search_state(tree_state, float(i), from_start=i % 2 == 0))
+
+    assert len(distance_map) == len(stored)
+    assert distance_map.nbytes > 8 * len(stored)
+    for i, tree_state in enumerate(stored):
+        dist, search_state = distance_map[tree_state]
+        assert dist == search_state.dist == i
+        assert search_state.depth == i
+        assert search_state.from_start == (i % 2 == 0)
+        assert search_state.tree_state == tree_state
+    for tree_state in STATES[1::2]:
+        assert tree_state not in distance_map
+        with pytest.raises(KeyError):
+            distance_map[tree_state]
+
+
+def test_bloom_filter_rules_out_most_missing_states_before_probing():
+    distance_map = CompactDistanceMap(fingerprint_bits=128, bloom_filter_capacity=len(STATES))
+    for tree_state in STATES[:100]:
+        distance_map[tree_state] = (1.0, _search_state(tree_state, 1.0))
+
+    # _locate returns slot -1 when the filter answers without probing the table
+    ruled_out = sum(distance_map._locate(tree_state)[2] == -1 for tree_state in STATES[100:])
+    assert ruled_out > 0.9 * len(STATES[100:])
+    assert all(tree_state in distance_map for tree_state in STATES[:100])
+
+
+def test_wide_fingerprints_are_compared_in_full():
+    distance_map = CompactDistanceMap(fingerprint_bits=128)
+    tree_state = STATES[0]
+    distance_map[tree_state] = (1.0, _search_state(tree_state, 1.0))
+    _, high, slot, _ = distance_map._locate(tree_state)
+
+    distance_map._fingerprints_high[slot] = high ^ 1
+    distance_map._last_state = None
+    assert tree_state not in distance_map
+
+
+@pytest.mark.parametrize("factory", MAPS.values(), ids=MAPS.keys())
+def test_visited_flag_round_trips(factory):
+    distance_map = factory()
+    tree_state = STATES[1]
+    distance_map[tree_state] = (3.5, _search_state(tree_state, 3.5))
+    assert distance_map[tree_state][0] == 3.5
+
+    distance_map[tree_state] = (-sys.maxsize, _search_state(tree_state, 3.5))
+    dist, search_state = distance_map[tree_state]
+    assert dist == -sys.maxsize
+    assert search_state.dist == 3.5
+
+    # a cheaper path found later reopens the state
+    distance_map[tree_state] = (2.0, _search_state(tree_state, 2.0))
+    assert distance_map[tree_state][0] == 2.0
+
+
+@pytest.mark.parametrize("batch_expansion", [False, True])
+@pytest.mark.parametrize("backward_in_forward_coordinates", [False, True])
+@pytest.mark.parametrize("unidirectional", [False, True])
+@pytest.mark.parametrize("factory", MAPS.values(), ids=MAPS.keys())
+def test_search_matches_dict(tree_string, factory, unidirectional, backward_in_forward_coordinates, batch_expansion):
+    tree = parse_tree_string(tree_string)
+    options = dict(
+        backward_in_forward_coordinates=backward_in_forward_coordinates, batch_expansion=batch_expansion
+    )
+    expected = PtStateSpaceSearch(tree, TupleTreeState, **options).search(unidirectional)
+
+    result = PtStateSpaceSearch(tree, TupleTreeState, distance_map_factory=factory, **options).search(unidirectional)
+
+    assert result.cost == expected.cost
+    # states in the compact map have no parent, so the path is rebuilt by _get_parent
+    assert len(result.firing_sequence) == len(expected.firing_sequence)
+    assert len(result.leaf_sequence) == len(expected.leaf_sequence)
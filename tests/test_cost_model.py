@@ -0,0 +1,72 @@
+import heapq
+import itertools
+
+import pytest
+
+from cost_model import LabelWeightCostModel, LeafExecutionCostModel, UnitCostModel, cost_model_from_spec
+from open_set import HeapOpenSet, ZeroOneOpenSet
+from search import PtStateSpaceSearch
+from semantics import ProcessTreeSemanticsInvertible
+from tree_state import TupleTreeState
+from tree_utils import is_leaf, parse_tree_string
+
+COST_MODELS = [
+    UnitCostModel(),
+    LeafExecutionCostModel(),
+    LabelWeightCostModel({"a": 0, "c": 0}, silent_cost=1),
+    LabelWeightCostModel({"a": 2, "d": 0.5, "f": 3}, silent_cost=0.25),
+]
+COST_MODEL_IDS = ["unit", "leaf", "label-zero-one", "label"]
+
+
+def _optimal_cost(tree, cost_model) -> float:
+    """Plain forward Dijkstra over the reference semantics."""
+    start = TupleTreeState.get_initial_state(tree)
+    goal = start.invert()
+    counter = itertools.count()
+    distances = {start: 0}
+    open_set = [(0, next(counter), start)]
+
+    while open_set:
+        dist, _, state = heapq.heappop(open_set)
+        if state == goal:
+            return dist
+        if dist > distances[state]:
+            continue
+        for transition in ProcessTreeSemanticsInvertible.get_valid_transitions(tree, state):
+            executed_leaf = transition.node if is_leaf(transition.node) and transition.is_future_to_open() else None
+            new_dist = dist + cost_model.get_cost(transition, executed_leaf)
+            new_state = state.update(transition.node, transition.to_state)
+            if new_dist < distances.get(new_state, float("inf")):
+                distances[new_state] = new_dist
+                heapq.heappush(open_set, (new_dist, next(counter), new_state))
+    raise AssertionError("goal state is unreachable")
+
+
+@pytest.mark.parametrize("mode", ["unidirectional", "bidirectional", "batch"])
+@pytest.mark.parametrize("cost_model", COST_MODELS, ids=COST_MODEL_IDS)
+def test_search_finds_optimal_cost(tree_string, cost_model, mode):
+    tree = parse_tree_string(tree_string)
+    search = PtStateSpaceSearch(tree, TupleTreeState, batch_expansion=mode == "batch", cost_model=cost_model)
+
+    result = search.search(unidirectional=mode == "unidirectional")
+
+    expected_open_set = ZeroOneOpenSet if cost_model.is_zero_one else HeapOpenSet
+    assert type(search._search_data_structures.open_set_forward) is expected_open_set
+    assert result.cost == pytest.approx(_optimal_cost(tree, cost_model))
+
+
+def test_cost_model_from_spec():
+    assert isinstance(cost_model_from_spec("unit"), UnitCostModel)
+    assert isinstance(cost_model_from_spec({"name": "leaf"}), LeafExecutionCostModel)
+    label = cost_model_from_spec({"name": "label", "weights": {"a": 2}, "silent_cost": 0.5})
+    assert isinstance(label, LabelWeightCostModel)
+    assert (label.weights, label.default_weight, label.silent_cost) == ({"a": 2}, 1, 0.5)
+
+
+@pytest.mark.parametrize(
+    "spec", ["cheapest", 5, {"weights": {}}, {"name": "label"}, {"name": "unit", "weights": {}}]
+)
+def test_cost_model_from_spec_rejects_invalid_specs(spec):
+    with pytest.raises(ValueError):
+        cost_model_from_spec(spec)
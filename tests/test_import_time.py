@@ -0,0 +1,15 @@
+from evaluation.import_time import CORE_MODULES, HEAVY_MODULES, measure
+
+
+def test_core_imports_no_optional_dependency():
+    # the time budget depends on the machine, so only the script enforces it
+    _, heavy = measure(CORE_MODULES, repeat=1)
+
+    assert heavy == [], f"importing {', '.join(CORE_MODULES)} loads {', '.join(heavy)}"
+
+
+def test_probe_detects_heavy_imports():
+    _, heavy = measure(("search", "batch_semantics"), repeat=1)
+
+    assert "numpy" in heavy
+    assert set(heavy) <= set(HEAVY_MODULES)
@@ -0,0 +1,62 @@
+from typing import Optional
+
+import pytest
+
+from cost_model import LabelWeightCostModel, LeafExecutionCostModel, TransitionCostModel, UnitCostModel
+from parallel_search import HashDistributedSearch, WorkerError
+from process_tree import ProcessTree
+from search import PtStateSpaceSearch
+from semantics import Transition
+from tree_state import TupleTreeState
+from tree_utils import is_leaf, parse_tree_string
+
+COST_MODELS = [UnitCostModel(), LeafExecutionCostModel(), LabelWeightCostModel({"a": 2, "d": 0.5}, silent_cost=0.25)]
+COST_MODEL_IDS = ["unit", "leaf", "label"]
+
+
+class FailingCostModel(TransitionCostModel):
+    def get_cost(self, transition: Transition, executed_leaf: Optional[ProcessTree]) -> float:
+        raise KeyError("no cost for this transition")
+
+
+def _executed_leaf(transition):
+    return transition.node if is_leaf(transition.node) and transition.is_future_to_open() else None
+
+
+@pytest.mark.parametrize("cost_model", COST_MODELS, ids=COST_MODEL_IDS)
+def test_finds_the_cost_of_unidirectional_search(tree_string, cost_model):
+    tree = parse_tree_string(tree_string)
+    expected = PtStateSpaceSearch(tree, TupleTreeState, cost_model=cost_model).search(unidirectional=True)
+
+    result = HashDistributedSearch(tree, TupleTreeState, num_workers=2, cost_model=cost_model).search()
+
+    assert result.cost == pytest.approx(expected.cost)
+    # equally cheap paths may differ, so the traced path is checked against its own cost
+    executed_leaves = [_executed_leaf(transition) for transition in result.firing_sequence]
+    assert result.leaf_sequence == [leaf for leaf in executed_leaves if leaf is not None]
+    assert result.cost == pytest.approx(
+        sum(map(cost_model.get_cost, result.firing_sequence, executed_leaves))
+    )
+
+
+# trees with a single cheapest leaf order
+@pytest.mark.parametrize("tree_string", ["->('a','b','c')", "->('a',<-('b','c'),'d')", "X(->('a','b','c'),'d')"])
+@pytest.mark.parametrize("cost_model", COST_MODELS, ids=COST_MODEL_IDS)
+def test_leaf_sequence_matches_unidirectional_search(tree_string, cost_model):
+    tree = parse_tree_string(tree_string)
+    expected = PtStateSpaceSearch(tree, TupleTreeState, cost_model=cost_model).search(unidirectional=True)
+
+    result = HashDistributedSearch(tree, TupleTreeState, num_workers=2, cost_model=cost_model).search()
+
+    assert [leaf.label for leaf in result.leaf_sequence] == [leaf.label for leaf in expected.leaf_sequence]
+
+
+def test_worker_exception_reaches_the_caller():
+    search = HashDistributedSearch(
+        parse_tree_string("->('a','b')"), TupleTreeState, num_workers=2, cost_model=FailingCostModel()
+    )
+
+    with pytest.raises(KeyError, match="no cost for this transition") as excinfo:
+        search.search()
+    assert isinstance(excinfo.value.__cause__, WorkerError)
+    assert "worker" in str(excinfo.value.__cause__)
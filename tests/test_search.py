@@ -0,0 +1,20 @@
+import pytest
+
+from search import PtStateSpaceSearch
+from tree_state import TupleTreeState
+from tree_utils import parse_tree_string
+
+
+@pytest.mark.parametrize("batch_expansion", [False, True])
+@pytest.mark.parametrize("unidirectional", [False, True])
+def test_backward_in_forward_coordinates_matches_default(tree_string, unidirectional, batch_expansion):
+    tree = parse_tree_string(tree_string)
+    expected = PtStateSpaceSearch(tree, TupleTreeState, batch_expansion=batch_expansion).search(unidirectional)
+
+    result = PtStateSpaceSearch(
+        tree, TupleTreeState, backward_in_forward_coordinates=True, batch_expansion=batch_expansion
+    ).search(unidirectional)
+
+    assert result.cost == expected.cost
+    assert len(result.firing_sequence) == len(expected.firing_sequence)
+    assert len(result.leaf_sequence) == len(expected.leaf_sequence)
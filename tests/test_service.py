@@ -0,0 +1,180 @@
+import asyncio
+import json
+
+import pytest
+
+from service import SearchService, _handle_connection, run_search
+
+TREE = "->('a','b')"
+OTHER_TREE = "X('a','b')"
+
+
+def test_identical_trees_share_one_search():
+    async def main():
+        async with SearchService(max_workers=1) as service:
+            results = await asyncio.gather(
+                service.search(TREE), service.search("->( 'a' , 'b' )"), service.search(TREE)
+            )
+            return service.statistics, results
+
+    statistics, results = asyncio.run(main())
+
+    assert statistics.requests == 3
+    assert statistics.coalesced == 2
+    assert statistics.completed == 3
+    assert results[0] == results[1] == results[2]
+    assert results[0]["cost"] == 6
+
+
+def test_requests_choose_the_cost_model():
+    label = {"name": "label", "weights": {"a": 3, "b": 0.5}, "silent_cost": 0.25}
+
+    async def main():
+        async with SearchService(max_workers=1) as service:
+            results = await asyncio.gather(
+                service.search(OTHER_TREE, cost_model="leaf"),
+                service.search(OTHER_TREE, cost_model=label),
+                service.search(OTHER_TREE, cost_model=dict(reversed(list(label.items())))),
+            )
+            return service.statistics, results
+
+    statistics, results = asyncio.run(main())
+
+    assert [result["cost"] for result in results] == [1, 1.5, 1.5]
+    assert results[1]["leaf_sequence"] == ["b"]
+    # the same spec with its keys in another order is the same search
+    assert statistics.coalesced == 1
+    with pytest.raises(ValueError, match="unknown cost model"):
+        run_search(TREE, cost_model="cheapest")
+
+
+def test_full_queue_makes_callers_wait():
+    async def main():
+        # without dispatchers nothing leaves the queue
+        service = SearchService(max_workers=1, max_pending=1)
+        first = asyncio.create_task(service.search(TREE))
+        second = asyncio.create_task(service.search(OTHER_TREE))
+        await asyncio.sleep(0.1)
+        queued = service._queue.qsize()
+        waiting = not first.done() and not second.done()
+
+        service.start()
+        results = await asyncio.wait_for(asyncio.gather(first, second), 10)
+        await service.close()
+        return queued, waiting, results
+
+    queued, waiting, results = asyncio.run(main())
+
+    assert queued == 1
+    assert waiting
+    assert [result["cost"] for result in results] == [6, 5]
+
+
+def test_close_fails_pending_searches():
+    async def main():
+        service = SearchService(max_workers=1, max_pending=1)
+        queued = asyncio.create_task(service.search(TREE))
+        blocked = asyncio.create_task(service.search(OTHER_TREE))
+        await asyncio.sleep(0.1)
+
+        await service.close()
+        outcomes = await asyncio.wait_for(asyncio.gather(queued, blocked, return_exceptions=True), 5)
+        with pytest.raises(RuntimeError, match="closed"):
+            await service.search(TREE)
+        return outcomes, service.statistics
+
+    outcomes, statistics = asyncio.run(main())
+
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+    assert statistics.failed == 2
+
+
+def test_cancelling_the_first_caller_keeps_coalesced_callers_going():
+    async def main():
+        service = SearchService(max_workers=1, max_pending=1)
+        filler = asyncio.create_task(service.search(OTHER_TREE))
+        await asyncio.sleep(0)
+        # the queue is full, so the first caller for TREE waits in put and the second joins it
+        first = asyncio.create_task(service.search(TREE))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(service.search(TREE))
+        await asyncio.sleep(0)
+        first.cancel()
+
+        service.start()
+        result = await asyncio.wait_for(second, 10)
+        await filler
+        await service.close()
+        return result, first.cancelled(), service.statistics
+
+    result, first_cancelled, statistics = asyncio.run(main())
+
+    assert first_cancelled
+    assert statistics.coalesced == 1
+    assert result["cost"] == 6
+
+
+def test_connection_stops_reading_while_its_requests_are_pending():
+    async def main():
+        # without dispatchers no request is answered
+        service = SearchService(max_workers=1, max_pending=2)
+        server = await asyncio.start_server(
+            lambda reader, writer: _handle_connection(service, reader, writer), "127.0.0.1", 0
+        )
+        async with server:
+            reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+            trees = [f"->('a{i}','b')" for i in range(10)]
+            writer.write("".join(json.dumps({"id": i, "tree": tree}) + "\n" for i, tree in enumerate(trees)).encode())
+            await writer.drain()
+            await asyncio.sleep(0.2)
+            requests = service.statistics.requests
+            writer.close()
+            await service.close()
+        return requests
+
+    assert asyncio.run(main()) == 2
+
+
+def test_json_lines_protocol():
+    lines = [
+        "not json",
+        "[1, 2]",
+        json.dumps({"id": 1, "tree": 5}),
+        json.dumps({"id": 2, "tree": TREE}),
+        json.dumps({"id": 3, "stats": True}),
+    ]
+
+    async def main():
+        async with SearchService(max_workers=1) as service:
+            server = await asyncio.start_server(
+                lambda reader, writer: _handle_connection(service, reader, writer), "127.0.0.1", 0
+            )
+            async with server:
+                reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+                writer.write("".join(line + "\n" for line in lines).encode())
+                await writer.drain()
+                writer.write_eof()
+                responses = [json.loads(line) for line in await asyncio.wait_for(_read_all(reader), 10)]
+                writer.close()
+                await writer.wait_closed()
+        return responses
+
+    responses = asyncio.run(main())
+
+    assert len(responses) == len(lines)
+    errors = [response["error"] for response in responses if "id" not in response]
+    assert len(errors) == 2
+    assert errors[0].startswith("invalid request:")
+    assert errors[1] == "invalid request: expected a JSON object"
+    by_id = {response["id"]: response for response in responses if "id" in response}
+    assert by_id[1]["error"] == 'invalid request: "tree" must be a string'
+    assert by_id[2]["cost"] == 6
+    assert by_id[2]["leaf_sequence"] == ["a", "b"]
+    assert by_id[3]["stats"]["requests"] <= 1
+
+
+async def _read_all(reader):
+    lines = []
+    while line := await reader.readline():
+        lines.append(line)
+    return lines